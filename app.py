@@ -5,6 +5,12 @@ from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.exc import OperationalError
 from flask_login import LoginManager
 from email_utils import init_mail_app
+from instrumentation import init_instrumentation
+from metrics import init_metrics
+from page_cache import init_page_cache, cached_page, listing_key
+from http_cache import init_http_cache
+from assets import init_assets
+from room_images import init_room_images
 from datetime import datetime
 from time import sleep
 
@@ -38,11 +44,23 @@ else:
 app.config["SQLALCHEMY_DATABASE_URI"] = database_url
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["DEBUG"] = True
+# Seconds the admin dashboard statistics are cached for
+app.config["DASHBOARD_CACHE_TTL"] = int(os.environ.get("DASHBOARD_CACHE_TTL", 30))
+# Seconds a logged-in user's identity is cached for between database lookups
+app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 60))
+# Redis URL that shares the user cache between workers, so an edit in one is
+# seen by all; defaults to the page cache's Redis, else a per-process cache
+app.config["USER_CACHE_URL"] = os.environ.get("USER_CACHE_URL") or os.environ.get("PAGE_CACHE_URL")
+# Seconds a page of a room's reviews is cached for
+app.config["REVIEW_CACHE_TTL"] = int(os.environ.get("REVIEW_CACHE_TTL", 300))
+# Minutes an unpaid pending booking holds its rooms before worker.py expires it
+app.config["BOOKING_HOLD_MINUTES"] = int(os.environ.get("BOOKING_HOLD_MINUTES", 30))
 
 # Stripe Configuration
 app.config["STRIPE_PUBLISHABLE_KEY"] = os.environ.get("STRIPE_PUBLISHABLE_KEY")
 app.config["STRIPE_SECRET_KEY"] = os.environ.get("STRIPE_SECRET_KEY")
-app.config["STRIPE_WEBHOOK_SECRET"] = os.environ.get("STRIPE_WEBHOOK_SECRET", "whsec_test")
+# Signing secret of the /stripe/webhook endpoint; events are rejected without it
+app.config["STRIPE_WEBHOOK_SECRET"] = os.environ.get("STRIPE_WEBHOOK_SECRET")
 
 def get_db():
     max_retries = 3
@@ -67,13 +85,45 @@ login_manager.login_message_category = 'info'
 # Initialize email
 init_mail_app(app)
 
+# Per-request query counts and timings, slow query logging
+init_instrumentation(app)
+
+# Prometheus metrics at /metrics
+init_metrics(app)
+
+# Rendered pages and fragments for anonymous browsing
+init_page_cache(app)
+
+# ETags and Cache-Control for room pages and the availability API
+init_http_cache(app)
+
+# Fingerprinted, precompressed static files and image variants (build_assets.py)
+init_assets(app)
+
+# Room photos stored and resized locally at upload time
+init_room_images(app)
+
 @login_manager.user_loader
-def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+def load_user(session_id):
+    from models import User, CachedUser, user_cache
+    # Session ids are "<user id>:<password fingerprint>" (see User.get_id), so
+    # a password change ends every session started with the old password
+    user_id, _, fingerprint = session_id.partition(':')
+    user_id = int(user_id)
+    user = user_cache.get(user_id)
+    if user is None or user.fingerprint != fingerprint:
+        db_user = db.session.get(User, user_id)
+        if db_user is None:
+            return None
+        user = CachedUser.from_user(db_user)
+        user_cache.set(user_id, user)
+    if user.fingerprint != fingerprint:
+        return None
+    return user
 
 # Basic routes
 @app.route('/')
+@cached_page(lambda: listing_key('index'))
 def index():
     from models import Room
     featured_rooms = Room.query.filter_by(available=True).limit(4).all()
@@ -100,7 +150,12 @@ def inject_current_year():
 from routes import *
 from oauth_routes import *
 from auth_routes import *
+from webhook_routes import *
 
-# Create database tables
+# Create database tables, add any new columns to existing ones and fill a
+# new inventory ledger from existing bookings before serving requests
 with app.app_context():
     db.create_all()
+    from migrate import add_missing_columns, backfill_ledger
+    add_missing_columns()
+    backfill_ledger()
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import mimetypes
+import os
+from flask import request, send_from_directory, url_for
+from PIL import Image, ImageOps
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# Output of build_assets.py, served from /assets/ with far-future caching
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Widths generated for photos; images narrower than a width skip it
+IMAGE_WIDTHS = (480, 960, 1600)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Changing these makes every image variant get a new name
+IMAGE_SETTINGS = f"{IMAGE_WIDTHS}:{WEBP_QUALITY}:{JPEG_QUALITY}"
+
+# Precompressed copies are looked up in this order
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest = {'files': {}, 'images': {}, 'compressed': {}}
+
+def content_hash(data, salt=''):
+    return hashlib.sha256(salt.encode() + data).hexdigest()[:10]
+
+def fingerprinted(path, digest, suffix=''):
+    """css/style.css -> css/style.<digest>.css, with suffix before the extension"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{suffix}{ext}"
+
+def write_image_variants(image, name, out_dir, widths=IMAGE_WIDTHS):
+    """Write resized WebP and JPEG (PNG when transparent) copies of a Pillow image.
+
+    name is the variant path relative to out_dir without width or extension,
+    e.g. 'image/room_1.3f9c2a1b7e'. Existing files are left alone, since a
+    name already identifies its content. Returns the manifest entry:
+    {'width', 'height', 'sources': {mimetype: [[width, path], ...]}}, where
+    width and height are those of the largest variant.
+    """
+    image = ImageOps.exif_transpose(image)
+    transparent = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if transparent else 'RGB')
+    fallback = ('image/png', '.png', 'PNG', {'optimize': True}) if transparent else \
+        ('image/jpeg', '.jpg', 'JPEG', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True})
+    formats = (('image/webp', '.webp', 'WEBP', {'quality': WEBP_QUALITY, 'method': 6}), fallback)
+
+    sizes = sorted({width for width in widths if width < image.width} | {min(image.width, max(widths))})
+    entry = {'sources': {mimetype: [] for mimetype, _, _, _ in formats}}
+    for width in sizes:
+        height = round(image.height * width / image.width)
+        resized = None
+        for mimetype, ext, pil_format, options in formats:
+            path = f"{name}-{width}w{ext}"
+            target = os.path.join(out_dir, path)
+            if not os.path.exists(target):
+                if resized is None:
+                    resized = image.resize((width, height), Image.LANCZOS)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                resized.save(target, pil_format, **options)
+            entry['sources'][mimetype].append([width, path])
+        entry['width'], entry['height'] = width, height
+    return entry
+
+def load_manifest(path):
+    global _manifest
+    try:
+        with open(path) as f:
+            _manifest = json.load(f)
+    except FileNotFoundError:
+        # Not built yet (e.g. in development): assets are served from /static
+        _manifest = {'files': {}, 'images': {}, 'compressed': {}}
+
+def asset_url(filename):
+    """URL of a static file, fingerprinted when build_assets.py has processed it"""
+    built = _manifest['files'].get(filename)
+    if built is None:
+        return url_for('static', filename=filename)
+    return url_for('assets', filename=built)
+
+def responsive_image(entry, endpoint):
+    """Template data for a write_image_variants entry whose files are served by endpoint.
+
+    Returns a dict with width, height, src (largest fallback), srcset (the
+    fallback format) and sources, a list of (mimetype, srcset) for <source>
+    elements.
+    """
+    def srcset(variants):
+        return ', '.join(f"{url_for(endpoint, filename=path)} {width}w" for width, path in variants)
+
+    webp = entry['sources']['image/webp']
+    fallback = next(variants for mimetype, variants in entry['sources'].items() if mimetype != 'image/webp')
+    return {
+        'width': entry['width'],
+        'height': entry['height'],
+        'src': url_for(endpoint, filename=fallback[-1][1]),
+        'srcset': srcset(fallback),
+        'sources': [('image/webp', srcset(webp))]
+    }
+
+def asset_image(filename):
+    """Responsive variants of a static image, or None when it has none"""
+    image = _manifest['images'].get(filename)
+    if image is None:
+        return None
+    return responsive_image(image, 'assets')
+
+def init_assets(app):
+    """Serve build_assets.py output with long-lived caching and precompressed copies"""
+    app.config['ASSET_MANIFEST'] = os.environ.get('ASSET_MANIFEST', os.path.join(DIST_DIR, 'manifest.json'))
+    # Fingerprinted names change with their content, so clients may keep them
+    app.config['ASSET_MAX_AGE'] = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))
+    load_manifest(app.config['ASSET_MANIFEST'])
+    app.jinja_env.globals.update(asset_url=asset_url, asset_image=asset_image)
+
+    @app.route('/assets/<path:filename>')
+    def assets(filename):
+        encodings = _manifest['compressed'].get(filename, [])
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype,
+                                               max_age=app.config['ASSET_MAX_AGE'])
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(DIST_DIR, filename, max_age=app.config['ASSET_MAX_AGE'])
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
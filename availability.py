@@ -0,0 +1,320 @@
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app import app, db
+from cache import bookings_changed
+from metrics import record_booking_events
+from models import Room, Booking, RoomInventory
+
+# Ledger column that each booking status occupies; other statuses hold no rooms
+LEDGER_COLUMNS = {
+    'pending': 'held',
+    'confirmed': 'booked',
+}
+
+class RoomUnavailable(Exception):
+    """Raised when a stay cannot be reserved because the room type is full."""
+
+def stay_nights(check_in, check_out):
+    """Return the list of nights covered by a stay of [check_in, check_out)."""
+    return [check_in + timedelta(days=i) for i in range((check_out - check_in).days)]
+
+def get_free_counts(check_in, check_out, room_ids=None, available_only=True):
+    """Return {room_id: free rooms} for every matching room over [check_in, check_out).
+
+    Free rooms are the minimum over the stay's nights of the ledger, resolved for
+    all rooms with a single grouped query.
+    """
+    occupied = db.session.query(
+        RoomInventory.room_id.label('room_id'),
+        func.max(RoomInventory.held + RoomInventory.booked).label('occupied')
+    ).filter(
+        RoomInventory.night >= check_in,
+        RoomInventory.night < check_out
+    ).group_by(RoomInventory.room_id).subquery()
+
+    query = db.session.query(
+        Room.id,
+        Room.total_rooms,
+        func.coalesce(occupied.c.occupied, 0)
+    ).outerjoin(occupied, occupied.c.room_id == Room.id).order_by(Room.id)
+
+    if available_only:
+        query = query.filter(Room.available == True)
+    if room_ids is not None:
+        query = query.filter(Room.id.in_(room_ids))
+
+    return {
+        room_id: max((total_rooms or 0) - occupied_rooms, 0)
+        for room_id, total_rooms, occupied_rooms in query.all()
+    }
+
+def get_free_count(room_id, check_in, check_out):
+    """Return the number of free rooms of one room type over [check_in, check_out)."""
+    return get_free_counts(check_in, check_out, room_ids=[room_id], available_only=False).get(room_id, 0)
+
+def get_calendar(start, end, room_ids=None, available_only=True):
+    """Return {room_id: [free rooms per night]} for every night in [start, end).
+
+    The ledger already holds per-night occupancy, so the whole range for all
+    rooms comes from two queries: the rooms and the ledger rows in range.
+    """
+    query = db.session.query(Room.id, Room.total_rooms).order_by(Room.id)
+    if available_only:
+        query = query.filter(Room.available == True)
+    if room_ids is not None:
+        query = query.filter(Room.id.in_(room_ids))
+
+    nights = (end - start).days
+    calendar = {room_id: [total_rooms or 0] * nights for room_id, total_rooms in query.all()}
+    if not calendar:
+        return calendar
+
+    rows = db.session.query(
+        RoomInventory.room_id, RoomInventory.night, RoomInventory.held + RoomInventory.booked
+    ).filter(
+        RoomInventory.room_id.in_(calendar.keys()),
+        RoomInventory.night >= start,
+        RoomInventory.night < end
+    )
+    for room_id, night, occupied in rows:
+        free = calendar[room_id]
+        index = (night - start).days
+        free[index] = max(free[index] - occupied, 0)
+    return calendar
+
+def bump_inventory_version(room_ids=None):
+    """Mark the availability of rooms (all rooms when None) as changed. Does not commit."""
+    statement = update(Room).values(inventory_version=Room.inventory_version + 1)
+    if room_ids is not None:
+        statement = statement.where(Room.id.in_(room_ids))
+    db.session.execute(statement.execution_options(synchronize_session=False))
+
+def ensure_ledger_rows(room_id, check_in, check_out):
+    """Create any missing ledger rows for the nights of a stay."""
+    existing = {
+        night for (night,) in db.session.query(RoomInventory.night).filter(
+            RoomInventory.room_id == room_id,
+            RoomInventory.night >= check_in,
+            RoomInventory.night < check_out
+        )
+    }
+    missing = [
+        {'room_id': room_id, 'night': night, 'held': 0, 'booked': 0}
+        for night in stay_nights(check_in, check_out)
+        if night not in existing
+    ]
+    if missing:
+        db.session.execute(insert(RoomInventory), missing)
+
+def adjust_ledger(room_id, check_in, check_out, column, delta):
+    """Add delta to one ledger column for every night of a stay."""
+    ensure_ledger_rows(room_id, check_in, check_out)
+    ledger_column = getattr(RoomInventory, column)
+    db.session.execute(
+        update(RoomInventory)
+        .where(
+            RoomInventory.room_id == room_id,
+            RoomInventory.night >= check_in,
+            RoomInventory.night < check_out
+        )
+        .values({column: ledger_column + delta})
+    )
+    bump_inventory_version([room_id])
+
+def apply_status_change(booking, old_status, new_status):
+    """Move a booking's rooms between ledger columns for a status transition.
+
+    A transition that starts occupying rooms again (e.g. confirming a
+    cancelled or expired booking) goes through the same locked capacity check
+    as a new reservation and raises RoomUnavailable when the room type is full;
+    the caller must then roll back. Does not commit, so the ledger changes
+    land in the caller's transaction.
+    """
+    old_column = LEDGER_COLUMNS.get(old_status)
+    new_column = LEDGER_COLUMNS.get(new_status)
+    if old_column == new_column:
+        return
+
+    quantity = booking.room_quantity or 1
+    if old_column:
+        adjust_ledger(booking.room_id, booking.check_in, booking.check_out, old_column, -quantity)
+    if new_column and old_column:
+        # Rooms already counted against capacity only change column
+        adjust_ledger(booking.room_id, booking.check_in, booking.check_out, new_column, quantity)
+    elif new_column:
+        room = db.session.query(Room).filter(Room.id == booking.room_id).with_for_update().one()
+        take_rooms(room, booking.check_in, booking.check_out, quantity, new_column)
+
+def set_booking_status(booking, new_status, expected_status=None):
+    """Change a booking's status only if it still has the status read earlier.
+
+    The check and the change are one conditional UPDATE, so a transition that
+    expire_holds, the webhook or another request made after the booking was
+    read is not applied twice to the ledger. expected_status defaults to the
+    booking's loaded status. Returns True if the status was changed; otherwise
+    the booking's status is refreshed. Raises RoomUnavailable as
+    apply_status_change does. Does not commit.
+    """
+    old_status = booking.status if expected_status is None else expected_status
+    result = db.session.execute(
+        update(Booking)
+        .where(Booking.id == booking.id, Booking.status == old_status)
+        .values(status=new_status)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.refresh(booking, ['status'])
+        return False
+    # The row is changed now; setting the attribute as well records the
+    # transition for booking events
+    booking.status = new_status
+    apply_status_change(booking, old_status, new_status)
+    return True
+
+def confirm_pending_booking(booking):
+    """Confirm a booking only if it is still pending, moving its rooms from held to booked.
+
+    Returns True if the booking was confirmed. Does not commit.
+    """
+    return set_booking_status(booking, 'confirmed', 'pending')
+
+def release_booking(booking):
+    """Return a booking's rooms to the ledger before the booking is deleted."""
+    apply_status_change(booking, booking.status, None)
+
+def take_rooms(room, check_in, check_out, quantity, column):
+    """Atomically add quantity to a ledger column only if every night has space.
+
+    The capacity check and the increment happen in one conditional UPDATE, so
+    concurrent writers cannot both pass the check for the last room.
+    """
+    if quantity < 1:
+        raise ValueError(f"Cannot reserve {quantity} rooms")
+    ensure_ledger_rows(room.id, check_in, check_out)
+    ledger_column = getattr(RoomInventory, column)
+    result = db.session.execute(
+        update(RoomInventory)
+        .where(
+            RoomInventory.room_id == room.id,
+            RoomInventory.night >= check_in,
+            RoomInventory.night < check_out,
+            RoomInventory.held + RoomInventory.booked + quantity <= room.total_rooms
+        )
+        .values({column: ledger_column + quantity})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(stay_nights(check_in, check_out)):
+        raise RoomUnavailable()
+    bump_inventory_version([room.id])
+
+def reserve_booking(booking, max_attempts=5, backoff=0.05):
+    """Insert a booking and reserve its rooms in one transaction, then commit.
+
+    Reservations are serialized per room type with a row lock on the room
+    (SELECT ... FOR UPDATE on Postgres; SQLite ignores it and serializes the
+    conditional UPDATE through its single writer lock). Lock timeouts,
+    deadlocks and concurrent ledger inserts are retried with jittered backoff.
+    Raises RoomUnavailable when the room type is full for any night of the stay.
+    """
+    for attempt in range(max_attempts):
+        try:
+            room = db.session.query(Room).filter(Room.id == booking.room_id).with_for_update().one()
+            take_rooms(room, booking.check_in, booking.check_out,
+                       booking.room_quantity or 1, LEDGER_COLUMNS[booking.status])
+            db.session.add(booking)
+            db.session.commit()
+            return booking
+        except RoomUnavailable:
+            db.session.rollback()
+            raise
+        except (OperationalError, IntegrityError) as e:
+            db.session.rollback()
+            if attempt == max_attempts - 1:
+                raise
+            app.logger.warning(f"Reservation conflict for room {booking.room_id}, retrying: {e.__class__.__name__}: {e.orig}")
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+def expire_holds(batch_size=1000):
+    """Expire pending bookings whose hold has lapsed and release their rooms.
+
+    One sweep claims up to batch_size lapsed holds, marks them 'expired' with a
+    single UPDATE ... RETURNING and takes the returned bookings' rooms out of
+    the ledger's held column with a single correlated UPDATE, then commits.
+    Pending bookings from before holds were recorded lapse
+    BOOKING_HOLD_MINUTES after they were created. Returns
+    the PaymentIntent ids of the expired bookings so they can be cancelled.
+    """
+    now = datetime.utcnow()
+    legacy_cutoff = now - timedelta(minutes=app.config['BOOKING_HOLD_MINUTES'])
+    claimed = db.session.query(
+        Booking.id, Booking.room_id, Booking.check_in, Booking.check_out, Booking.payment_intent_id
+    ).filter(
+        Booking.status == 'pending',
+        or_(
+            Booking.hold_expires_at < now,
+            and_(Booking.hold_expires_at.is_(None), Booking.created_at < legacy_cutoff)
+        )
+    ).order_by(Booking.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not claimed:
+        db.session.commit()
+        return []
+
+    ids = [row.id for row in claimed]
+    # Only rows still pending are expired, so a payment confirmed mid-sweep keeps
+    # its rooms; RETURNING tells this sweep's rows apart from a concurrent one
+    expired_ids = set(db.session.scalars(
+        update(Booking)
+        .where(Booking.id.in_(ids), Booking.status == 'pending')
+        .values(status='expired', cancelled_at=now, cancellation_reason='Payment hold expired')
+        .returning(Booking.id)
+        .execution_options(synchronize_session=False)
+    ))
+    if not expired_ids:
+        db.session.commit()
+        return []
+
+    expired_rooms = select(func.coalesce(func.sum(func.coalesce(Booking.room_quantity, 1)), 0)).where(
+        Booking.id.in_(expired_ids),
+        Booking.room_id == RoomInventory.room_id,
+        Booking.check_in <= RoomInventory.night,
+        Booking.check_out > RoomInventory.night
+    ).scalar_subquery()
+    db.session.execute(
+        update(RoomInventory)
+        .where(
+            RoomInventory.room_id.in_({row.room_id for row in claimed}),
+            RoomInventory.night >= min(row.check_in for row in claimed),
+            RoomInventory.night < max(row.check_out for row in claimed)
+        )
+        .values(held=RoomInventory.held - expired_rooms)
+        .execution_options(synchronize_session=False)
+    )
+    bump_inventory_version({row.room_id for row in claimed if row.id in expired_ids})
+    db.session.commit()
+    # Bulk UPDATEs bypass the session's booking change tracking
+    bookings_changed()
+    record_booking_events({'expired': len(expired_ids)})
+    return [row.payment_intent_id for row in claimed if row.id in expired_ids and row.payment_intent_id]
+
+def rebuild_ledger():
+    """Recompute the whole ledger from the Booking table. Does not commit."""
+    totals = {}
+    bookings = db.session.query(
+        Booking.room_id, Booking.check_in, Booking.check_out, Booking.room_quantity, Booking.status
+    ).filter(Booking.status.in_(LEDGER_COLUMNS.keys())).yield_per(1000)
+
+    for room_id, check_in, check_out, room_quantity, status in bookings:
+        column = LEDGER_COLUMNS[status]
+        for night in stay_nights(check_in, check_out):
+            row = totals.setdefault((room_id, night), {'room_id': room_id, 'night': night, 'held': 0, 'booked': 0})
+            row[column] += room_quantity or 1
+
+    db.session.query(RoomInventory).delete()
+    rows = list(totals.values())
+    for start in range(0, len(rows), 1000):
+        db.session.execute(insert(RoomInventory), rows[start:start + 1000])
+    bump_inventory_version()
+    return len(rows)
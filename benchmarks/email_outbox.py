@@ -0,0 +1,118 @@
+"""Check of the email outbox against a local SMTP stand-in.
+
+    python benchmarks/email_outbox.py
+
+Queues booking emails, drains them with email_utils.deliver_outbox and
+checks that queueing sends nothing, that a batch goes out over one pooled
+SMTP session, and that a failing delivery is retried with exponential
+backoff until MAX_DELIVERY_ATTEMPTS marks it failed. Uses a throwaway
+SQLite database.
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smtp_stub import SMTPStub
+
+# The stub must be listening before the app reads its mail settings
+smtp_stub = SMTPStub()
+os.environ.update({
+    'SMTP_SERVER': '127.0.0.1',
+    'SMTP_PORT': str(smtp_stub.start()),
+    'SMTP_USE_TLS': 'false',
+    'SMTP_USERNAME': '',
+    'SMTP_PASSWORD': 'stub',
+})
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+from app import app, db
+from models import User, Room, Booking, EmailOutbox
+from email_utils import (
+    MAX_DELIVERY_ATTEMPTS, RETRY_BACKOFF_SECONDS, deliver_outbox, queue_booking_confirmation, smtp_pool
+)
+
+failures = []
+
+def check(condition, message):
+    print(f"{'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+def seed():
+    user = User(email='outbox@ssparadise.com', name='Outbox Guest', password_hash='x')
+    room = Room(name='Outbox Room', description='Check room', price=1500, capacity=2,
+                room_type='Double', total_rooms=5, amenities=['Free Wi-Fi'])
+    db.session.add_all([user, room])
+    db.session.commit()
+    bookings = [
+        Booking(room_id=room.id, user_id=user.id, guest_name=f'Guest {i}', guest_email=f'guest{i}@ssparadise.com',
+                check_in=date(2030, 1, 1), check_out=date(2030, 1, 3), guests=1, room_quantity=1,
+                status='confirmed', payment_status='pending', payment_option='later')
+        for i in range(5)
+    ]
+    db.session.add_all(bookings)
+    db.session.commit()
+    return bookings
+
+def main():
+    with app.app_context():
+        db.create_all()
+        # Flask-Mail follows app.debug and would echo every SMTP exchange
+        app.extensions['mail'].debug = False
+        bookings = seed()
+
+        # Queueing stores the email and sends nothing
+        for booking in bookings[:3]:
+            queue_booking_confirmation(booking)
+        check(EmailOutbox.query.filter_by(status='pending').count() == 3, "queued emails are pending in the outbox")
+        check(smtp_stub.messages == 0, "queueing does not talk to SMTP")
+
+        # One batch is delivered over a single pooled session
+        attempted = deliver_outbox()
+        check(attempted == 3 and smtp_stub.messages == 3, "deliver_outbox sends every due email")
+        check(EmailOutbox.query.filter_by(status='sent').count() == 3, "delivered emails are marked sent")
+        check(smtp_stub.connections == 1, "the batch reuses one SMTP session")
+
+        # A temporary failure is rescheduled; the rest of the batch still goes out
+        queue_booking_confirmation(bookings[3])
+        queue_booking_confirmation(bookings[4])
+        smtp_stub.failures = 1
+        started = datetime.utcnow()
+        deliver_outbox()
+        failed, sent = EmailOutbox.query.order_by(EmailOutbox.id.desc()).limit(2).all()[::-1]
+        check(sent.status == 'sent', "a failure does not block the next email in the batch")
+        check(failed.status == 'pending' and failed.attempts == 1 and failed.last_error,
+              "a failed delivery stays pending with its error recorded")
+        delay = (failed.next_attempt_at - started).total_seconds()
+        check(RETRY_BACKOFF_SECONDS - 1 <= delay <= RETRY_BACKOFF_SECONDS + 5,
+              f"the first retry waits {RETRY_BACKOFF_SECONDS}s (waited {delay:.0f}s)")
+        check(deliver_outbox() == 0, "an email is not retried before its backoff ends")
+
+        # Each further failure doubles the wait until the email is given up on
+        smtp_stub.failures = MAX_DELIVERY_ATTEMPTS
+        for attempt in range(2, MAX_DELIVERY_ATTEMPTS + 1):
+            failed.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+            started = datetime.utcnow()
+            deliver_outbox()
+            db.session.refresh(failed)
+            if attempt < MAX_DELIVERY_ATTEMPTS:
+                expected = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                delay = (failed.next_attempt_at - started).total_seconds()
+                check(failed.status == 'pending' and expected - 1 <= delay <= expected + 5,
+                      f"attempt {attempt} fails and retries in {expected}s (waited {delay:.0f}s)")
+        check(failed.status == 'failed' and failed.attempts == MAX_DELIVERY_ATTEMPTS,
+              f"the email is marked failed after {MAX_DELIVERY_ATTEMPTS} attempts")
+        smtp_pool.close_all()
+
+    smtp_stub.stop()
+    if failures:
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
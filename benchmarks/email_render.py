@@ -0,0 +1,86 @@
+"""Micro-benchmark of per-email render time.
+
+    python benchmarks/email_render.py [iterations] [room_history]
+
+Compares the old path (render_template_string on every send, walking the
+room's booking history) with the precompiled templates and flattened
+context used by email_utils. Uses a throwaway SQLite database.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+from flask import render_template_string
+from sqlalchemy import insert
+from app import app, db
+from models import User, Room, Booking
+from email_utils import booking_email_context, booking_confirmation_text, booking_confirmation_html
+
+# The confirmation template as it was before precompilation
+LEGACY_TEMPLATE = '''
+Dear {{ booking.guest_name }},
+- Booking ID: {{ booking.id }}
+- Check-in: {{ booking.check_in.strftime('%Y-%m-%d') if booking.check_in else 'N/A' }}
+- Check-out: {{ booking.check_out.strftime('%Y-%m-%d') if booking.check_out else 'N/A' }}
+- Total Amount: {{ "%.2f"|format(booking.amount_paid if booking.amount_paid else (booking.room.price * (booking.check_out - booking.check_in).days)) }}
+- Payment Status: {{ booking.payment_status.title() }}
+- Room Type: {{ booking.room.room_type }}
+- Amenities: {{ booking.room.amenities|join(', ') }}
+- Total Rooms Booked: {{ booking.room.bookings|selectattr('status', 'equalto', 'confirmed')|list|length }}/{{ booking.room.total_rooms }}
+'''
+
+def seed(room_history):
+    user = User(email='bench@ssparadise.com', name='Bench', password_hash='x')
+    room = Room(name='Bench Room', description='Benchmark room', price=1500, capacity=2,
+                room_type='Double', total_rooms=6, amenities=['Air Conditioning', 'Free Wi-Fi'])
+    db.session.add_all([user, room])
+    db.session.commit()
+    db.session.execute(insert(Booking), [
+        {'room_id': room.id, 'user_id': user.id, 'guest_name': 'Guest', 'guest_email': 'guest@ssparadise.com',
+         'check_in': date(2024, 1, 1), 'check_out': date(2024, 1, 3), 'guests': 2, 'room_quantity': 1,
+         'status': 'confirmed', 'payment_status': 'completed', 'payment_option': 'now'}
+        for _ in range(room_history)
+    ])
+    booking = Booking(room_id=room.id, user_id=user.id, guest_name='Guest', guest_email='guest@ssparadise.com',
+                      check_in=date.today() + timedelta(days=10), check_out=date.today() + timedelta(days=12),
+                      guests=2, room_quantity=1, status='confirmed', payment_status='pending', payment_option='later')
+    db.session.add(booking)
+    db.session.commit()
+    return booking.id
+
+def measure(label, render, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        # Each email is rendered for a freshly loaded booking, as in the request path
+        db.session.expire_all()
+        render()
+    elapsed = (time.perf_counter() - started) / iterations * 1000
+    print(f"{label:<40} {elapsed:8.3f} ms/email")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    room_history = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    with app.app_context():
+        booking_id = seed(room_history)
+
+        def legacy():
+            booking = db.session.get(Booking, booking_id)
+            return render_template_string(LEGACY_TEMPLATE, booking=booking)
+
+        def compiled():
+            booking = db.session.get(Booking, booking_id)
+            context = booking_email_context(booking)
+            return booking_confirmation_text.render(context), booking_confirmation_html.render(context)
+
+        print(f"{iterations} emails, {room_history} past bookings on the room")
+        measure('render_template_string (legacy)', legacy, iterations)
+        measure('precompiled text + html', compiled, iterations)
+
+if __name__ == "__main__":
+    main()
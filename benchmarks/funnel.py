@@ -0,0 +1,368 @@
+"""Load benchmark for the booking funnel.
+
+    python benchmarks/funnel.py [--rooms N] [--bookings N] [--reviews N] [--iterations N]
+                                [--output FILE] [--compare FILE]
+
+Seeds a database at the requested scale (a throwaway SQLite file unless
+DATABASE_URL points at a scratch database; an already seeded database is
+reused), then drives the real Flask app in-process through the funnel:
+/rooms, /room/<id>, /api/check-room-availability, /booking/<id> (form and
+pay-later submit), /my-bookings, /admin/bookings and the Stripe webhook.
+Stripe and SMTP are local stubs, and email deliverability checks skip DNS.
+
+Reports p50/p95/p99 latency and queries per request for every step, then
+times the worker draining the webhook events and email outbox. Results are
+written as JSON (benchmarks/results/ by default) so runs from different
+commits can be compared with --compare.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from smtp_stub import SMTPStub
+from stripe_stub import StripeStub
+
+# Stubs must be listening before the app reads its mail and Stripe settings
+smtp_stub = SMTPStub()
+stripe_stub = StripeStub()
+os.environ.update({
+    'SMTP_SERVER': '127.0.0.1',
+    'SMTP_PORT': str(smtp_stub.start()),
+    'SMTP_USE_TLS': 'false',
+    'SMTP_USERNAME': '',
+    'SMTP_PASSWORD': 'stub',
+    'STRIPE_API_BASE': stripe_stub.start(),
+    'STRIPE_SECRET_KEY': 'sk_test_stub',
+    'STRIPE_WEBHOOK_SECRET': 'whsec_funnel',
+})
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+from email_validator import validate_email
+from sqlalchemy import func, insert
+from app import app, db
+from models import User, Room, Booking, Review, RoomInventory
+from availability import stay_nights
+from email_utils import deliver_outbox
+from payment import process_stripe_events
+import routes
+
+BENCH_EMAIL = 'funnel@ssparadise.com'
+ADMIN_EMAIL = 'funnel-admin@ssparadise.com'
+PASSWORD = 'funnel'
+BATCH = 5000
+
+def seed(args):
+    """Insert users, rooms, bookings with a consistent ledger, and reviews"""
+    today = date.today()
+    bench = User(email=BENCH_EMAIL, name='Funnel Guest')
+    bench.set_password(PASSWORD)
+    admin = User(email=ADMIN_EMAIL, name='Funnel Admin', is_admin=True)
+    admin.set_password(PASSWORD)
+    db.session.add_all([bench, admin])
+    db.session.commit()
+
+    db.session.execute(insert(User), [
+        {'email': f'guest{i}@ssparadise.com', 'name': f'Guest {i}', 'password_hash': 'x', 'is_admin': False}
+        for i in range(args.users)
+    ])
+    user_ids = [bench.id, admin.id] + list(range(admin.id + 1, admin.id + 1 + args.users))
+
+    # Ratings are drawn up front so each room is inserted with its aggregates.
+    # Each user reviews a room at most once (ux_review_user_room), so a room
+    # takes no more reviews than there are users
+    ratings = {}
+    for _ in range(args.reviews):
+        room_ratings = ratings.setdefault(random.randrange(args.rooms), [])
+        if len(room_ratings) < len(user_ids):
+            room_ratings.append(random.randint(1, 5))
+    rows = []
+    for i in range(args.rooms):
+        room_ratings = ratings.get(i, [])
+        rows.append({
+            'name': f'Room {i}', 'description': 'Benchmark room', 'price': random.choice([1500, 2500, 4000]),
+            'capacity': random.randint(2, 4), 'room_type': random.choice(['Single', 'Double', 'Suite']),
+            'total_rooms': random.randint(3, 10), 'available': True,
+            'amenities': ['Air Conditioning', 'Free Wi-Fi'],
+            'rating_sum': sum(room_ratings), 'rating_count': len(room_ratings)
+        })
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(insert(Room), rows[start:start + BATCH])
+    rooms = db.session.query(Room.id, Room.total_rooms).order_by(Room.id).all()
+
+    reviews = []
+    for index, room_ratings in ratings.items():
+        for user_id, rating in zip(random.sample(user_ids, len(room_ratings)), room_ratings):
+            reviews.append({'room_id': rooms[index].id, 'user_id': user_id, 'rating': rating,
+                            'comment': 'Benchmark review', 'created_at': datetime.utcnow() - timedelta(days=random.randrange(700))})
+        if len(reviews) >= BATCH:
+            db.session.execute(insert(Review), reviews)
+            reviews = []
+    if reviews:
+        db.session.execute(insert(Review), reviews)
+
+    # Bookings are generated room by room so the ledger for one room fits in
+    # memory and no night is oversold
+    per_room = max(args.bookings // len(rooms), 1)
+    bench_share = min(100 / args.bookings, 1)
+    bookings, ledger = [], []
+    serial = 0
+    for room_id, total_rooms in rooms:
+        occupancy = {}
+        for _ in range(per_room):
+            check_in = today + timedelta(days=random.randint(-365, 365))
+            check_out = check_in + timedelta(days=random.randint(1, 5))
+            quantity = random.choice([1, 1, 1, 2])
+            status = random.choices(['confirmed', 'cancelled', 'pending', 'expired'], [70, 15, 5, 10])[0]
+            nights = stay_nights(check_in, check_out)
+            if status in ('confirmed', 'pending'):
+                if any(sum(occupancy.get(night, (0, 0))) + quantity > total_rooms for night in nights):
+                    status = 'cancelled'
+                else:
+                    for night in nights:
+                        held, booked = occupancy.get(night, (0, 0))
+                        occupancy[night] = (held + quantity, booked) if status == 'pending' else (held, booked + quantity)
+            serial += 1
+            bookings.append({
+                'room_id': room_id,
+                'user_id': bench.id if random.random() < bench_share else random.choice(user_ids),
+                'guest_name': 'Guest', 'guest_email': 'guest@ssparadise.com',
+                'check_in': check_in, 'check_out': check_out, 'guests': 1, 'room_quantity': quantity,
+                'created_at': datetime.combine(check_in, datetime.min.time()) - timedelta(days=random.randint(1, 60)),
+                'status': status,
+                'hold_expires_at': datetime.utcnow() + timedelta(days=1) if status == 'pending' else None,
+                'payment_status': 'completed' if status == 'confirmed' else 'pending',
+                'payment_option': 'now',
+                'payment_intent_id': f'pi_seed_{serial}',
+            })
+            if len(bookings) >= BATCH:
+                db.session.execute(insert(Booking), bookings)
+                bookings = []
+        ledger.extend(
+            {'room_id': room_id, 'night': night, 'held': held, 'booked': booked}
+            for night, (held, booked) in occupancy.items()
+        )
+        if len(ledger) >= BATCH:
+            db.session.execute(insert(RoomInventory), ledger)
+            ledger = []
+    if bookings:
+        db.session.execute(insert(Booking), bookings)
+    if ledger:
+        db.session.execute(insert(RoomInventory), ledger)
+    db.session.commit()
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+def summarize(samples):
+    latencies = [latency for latency, _, _ in samples]
+    queries = [count for _, count, _ in samples]
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+        'statuses': statuses,
+    }
+
+def signed_event(intent_id):
+    payload = json.dumps({
+        'id': f'evt_{intent_id}', 'object': 'event', 'type': 'payment_intent.succeeded',
+        'data': {'object': {'id': intent_id, 'object': 'payment_intent', 'amount': 300000,
+                            'amount_received': 300000, 'created': int(time.time())}}
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(app.config['STRIPE_WEBHOOK_SECRET'].encode(), f"{timestamp}.{payload}".encode(),
+                         hashlib.sha256).hexdigest()
+    return payload, {'Stripe-Signature': f't={timestamp},v1={signature}', 'Content-Type': 'application/json'}
+
+def funnel_steps(room_ids, pending_intents):
+    """Return [(name, client, request factory)]; each factory returns (method, path, kwargs)"""
+    guest = app.test_client()
+    user = app.test_client()
+    admin = app.test_client()
+    user.post('/login', data={'email': BENCH_EMAIL, 'password': PASSWORD})
+    admin.post('/login', data={'email': ADMIN_EMAIL, 'password': PASSWORD})
+    today = date.today()
+    intents = iter(pending_intents)
+
+    def stay():
+        check_in = today + timedelta(days=random.randint(1, 300))
+        return check_in, check_in + timedelta(days=random.randint(1, 4))
+
+    def availability():
+        check_in, check_out = stay()
+        return 'GET', '/api/check-room-availability', {'query_string': {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}}
+
+    def booking_submit():
+        check_in, check_out = stay()
+        return 'POST', f'/booking/{random.choice(room_ids)}', {'data': {
+            'check_in': check_in.isoformat(), 'check_out': check_out.isoformat(), 'guests': 1,
+            'room_quantity': 1, 'name': 'Funnel Guest', 'email': 'funnel.guest@ssparadise.com',
+            'payment_option': 'later'
+        }}
+
+    def webhook():
+        payload, headers = signed_event(next(intents))
+        return 'POST', '/stripe/webhook', {'data': payload, 'headers': headers}
+
+    return [
+        ('rooms', guest, lambda: ('GET', '/rooms', {})),
+        ('room_detail', user, lambda: ('GET', f'/room/{random.choice(room_ids)}', {})),
+        ('check_availability', user, availability),
+        ('booking_form', user, lambda: ('GET', f'/booking/{random.choice(room_ids)}', {})),
+        ('booking_submit', user, booking_submit),
+        ('my_bookings', user, lambda: ('GET', '/my-bookings', {})),
+        ('admin_bookings', admin, lambda: ('GET', '/admin/bookings', {})),
+        ('admin_bookings_filtered', admin, lambda: ('GET', '/admin/bookings?status=confirmed', {})),
+        ('stripe_webhook', guest, webhook),
+    ]
+
+def run_step(client, make_request, iterations, warmup):
+    samples = []
+    for i in range(warmup + iterations):
+        method, path, kwargs = make_request()
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        if i >= warmup:
+            samples.append((elapsed, int(response.headers.get('X-Query-Count', 0)), response.status_code))
+    return summarize(samples)
+
+def drain_background():
+    """Time the worker applying the webhook events and sending the queued emails"""
+    started = time.perf_counter()
+    events = 0
+    while (applied := process_stripe_events()):
+        events += applied
+    events_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    emails = 0
+    while (sent := deliver_outbox()):
+        emails += sent
+    emails_s = time.perf_counter() - started
+    return {
+        'stripe_events': events, 'stripe_events_s': round(events_s, 3),
+        'emails': emails, 'emails_s': round(emails_s, 3), 'emails_received': smtp_stub.messages,
+        'smtp_connections': smtp_stub.connections,
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def print_report(results, baseline=None):
+    print(f"\n{'step':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}  statuses")
+    for name, step in results['steps'].items():
+        line = (f"{name:<26}{step['p50_ms']:>9.2f}{step['p95_ms']:>9.2f}{step['p99_ms']:>9.2f}"
+                f"{step['queries_per_request']:>9.2f}  {step['statuses']}")
+        before = (baseline or {}).get('steps', {}).get(name)
+        if before:
+            line += (f"  | p95 {step['p95_ms'] - before['p95_ms']:+.2f} ms,"
+                     f" queries {step['queries_per_request'] - before['queries_per_request']:+.2f}")
+        print(line)
+    print(f"\nBackground: {results['background']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--reviews', type=int, default=200000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='JSON results file (default benchmarks/results/funnel-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='Earlier JSON results to print deltas against')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # Per-request query counts come from the instrumentation headers
+    app.config['QUERY_STATS_HEADERS'] = True
+    app.config['SLOW_QUERY_MS'] = float('inf')
+    app.config['QUERY_COUNT_WARNING'] = 10 ** 9
+    # A failing route shows up as 500s in its step instead of aborting the run
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    app.logger.setLevel('CRITICAL')
+    # Flask-Mail follows app.debug and would echo every SMTP exchange
+    app.extensions['mail'].debug = False
+    routes.validate_email = lambda email, **kwargs: validate_email(email, check_deliverability=False)
+
+    try:
+        with app.app_context():
+            db.create_all()
+            if db.session.query(Room.id).first() is None:
+                print(f"Seeding {args.rooms} rooms, {args.bookings} bookings, {args.reviews} reviews...")
+                started = time.perf_counter()
+                seed(args)
+                print(f"Seeded in {time.perf_counter() - started:.1f}s")
+            else:
+                print("Reusing the seeded database")
+            room_ids = [room_id for (room_id,) in db.session.query(Room.id)]
+            pending_intents = [intent for (intent,) in db.session.query(Booking.payment_intent_id).filter(
+                Booking.status == 'pending', Booking.payment_intent_id.isnot(None)
+            ).limit(args.iterations + args.warmup)]
+            database = db.engine.dialect.name
+            counts = {
+                'rooms': len(room_ids),
+                'bookings': db.session.query(func.count(Booking.id)).scalar(),
+                'reviews': db.session.query(func.count(Review.id)).scalar(),
+            }
+            db.session.remove()
+
+        results = {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'database': database,
+            'dataset': counts,
+            'iterations': args.iterations,
+            'steps': {},
+        }
+        for name, client, make_request in funnel_steps(room_ids, pending_intents):
+            iterations = min(args.iterations, len(pending_intents) - args.warmup) if name == 'stripe_webhook' else args.iterations
+            if iterations <= 0:
+                continue
+            print(f"Running {name}...")
+            results['steps'][name] = run_step(client, make_request, iterations, args.warmup)
+
+        with app.app_context():
+            results['background'] = drain_background()
+    finally:
+        smtp_stub.stop()
+        stripe_stub.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, 'results', f"funnel-{results['commit']}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Check of Google sign-in discovery caching against a local OIDC stand-in.
+
+    python benchmarks/oauth_discovery.py
+
+Points GOOGLE_DISCOVERY_URL at benchmarks/oidc_stub.py and checks that the
+discovery document is cached for its Cache-Control max-age, refetched once
+that expires, never cached under no-store or no-cache, and cached for
+DEFAULT_DISCOVERY_TTL without a header. Then runs the sign-in callback a few
+times and checks that discovery, token and userinfo calls all share one
+pooled connection. Uses a throwaway SQLite database.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from oidc_stub import OIDCStub
+
+# The stub must be listening before oauth_config reads the discovery URL
+oidc_stub = OIDCStub()
+os.environ.update({
+    'GOOGLE_DISCOVERY_URL': f"{oidc_stub.start()}/.well-known/openid-configuration",
+    'GOOGLE_OAUTH_CLIENT_ID': 'stub-client',
+    'GOOGLE_OAUTH_CLIENT_SECRET': 'stub-secret',
+    # oauthlib refuses plain-HTTP redirect URIs otherwise
+    'OAUTHLIB_INSECURE_TRANSPORT': '1',
+})
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+from app import app, db
+from models import User
+from oauth_routes import DEFAULT_DISCOVERY_TTL, get_google_provider_cfg, oauth_http, provider_cfg_cache
+
+failures = []
+
+def check(condition, message):
+    print(f"{'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+def fetches(cache_control, calls, pause=0):
+    """Discovery requests the stub sees for calls lookups under cache_control"""
+    provider_cfg_cache.clear()
+    oidc_stub.cache_control = cache_control
+    before = oidc_stub.discovery_requests
+    for i in range(calls):
+        if i and pause:
+            time.sleep(pause)
+        if get_google_provider_cfg() is None:
+            return None
+    return oidc_stub.discovery_requests - before
+
+def main():
+    with app.app_context():
+        db.create_all()
+
+        check(fetches('public, max-age=1', 3) == 1, "max-age responses are served from the cache")
+        check(fetches('public, max-age=1', 2, pause=1.1) == 2, "the document is refetched once max-age expires")
+        check(fetches('no-store', 3) == 3, "no-store responses are never cached")
+        check(fetches('no-cache', 3) == 3, "no-cache responses are never cached")
+        check(fetches(None, 3) == 1, f"responses without Cache-Control are cached ({DEFAULT_DISCOVERY_TTL}s)")
+
+        # A fresh pool, so every connection opened from here on is counted
+        oauth_http.close()
+        provider_cfg_cache.clear()
+        oidc_stub.cache_control = 'public, max-age=3600'
+        connections = oidc_stub.connections
+        before = oidc_stub.requests
+        client = app.test_client()
+        for _ in range(3):
+            response = client.get('/login/google/callback?code=stub-code')
+            check(response.status_code == 302 and response.location.endswith('/'),
+                  "the callback signs the user in")
+        check(User.query.filter_by(email='oidc.guest@ssparadise.com').count() == 1,
+              "the Google user is created once")
+        # One discovery fetch, then a token and userinfo call per sign-in
+        check(oidc_stub.requests - before == 7, f"discovery is fetched once across sign-ins ({oidc_stub.requests - before} requests)")
+        opened = oidc_stub.connections - connections
+        check(opened == 1, f"all OAuth calls reuse one connection ({opened} opened)")
+
+    oidc_stub.stop()
+    if failures:
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
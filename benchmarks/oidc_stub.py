@@ -0,0 +1,81 @@
+"""Minimal in-process stand-in for Google's OpenID Connect endpoints.
+
+Serves the discovery document at /.well-known/openid-configuration with a
+configurable Cache-Control header, a token endpoint and a userinfo
+endpoint, over HTTP/1.1 keep-alive. Counts discovery fetches and TCP
+connections so callers can check caching and connection reuse. Point the
+app at it with GOOGLE_DISCOVERY_URL (see oauth_config.py).
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class OIDCStub:
+    def __init__(self):
+        self.cache_control = 'public, max-age=3600'
+        self.discovery_requests = 0
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.base_url = None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def respond(self, payload, cache_control=None):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if cache_control:
+                    self.send_header('Cache-Control', cache_control)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                if self.path == '/.well-known/openid-configuration':
+                    with stub.lock:
+                        stub.discovery_requests += 1
+                    self.respond({
+                        'issuer': stub.base_url,
+                        'authorization_endpoint': f'{stub.base_url}/auth',
+                        'token_endpoint': f'{stub.base_url}/token',
+                        'userinfo_endpoint': f'{stub.base_url}/userinfo',
+                    }, stub.cache_control)
+                elif self.path.startswith('/userinfo'):
+                    self.respond({'sub': '1234567890', 'email': 'oidc.guest@ssparadise.com',
+                                  'email_verified': True, 'name': 'OIDC Guest'})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                with stub.lock:
+                    stub.requests += 1
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.path == '/token':
+                    self.respond({'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600})
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
@@ -0,0 +1,127 @@
+"""Query plans and timings for Booking hot paths before and after the model indexes.
+
+    python benchmarks/query_plans.py [bookings]
+
+Seeds a throwaway SQLite database (or uses DATABASE_URL when set, which must
+be an empty scratch database), drops the Booking indexes, explains and times
+each hot query, then recreates the indexes with migrate.add_missing_indexes
+and repeats.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+from sqlalchemy import and_, func, insert, or_, select, text
+from app import app, db
+from models import User, Room, Booking
+from migrate import add_missing_indexes
+
+ROOMS = 50
+USERS = 2000
+
+def seed(bookings):
+    db.session.execute(insert(User), [
+        {'email': f'bench{i}@ssparadise.com', 'name': f'Bench {i}', 'password_hash': 'x', 'is_admin': False}
+        for i in range(USERS)
+    ])
+    db.session.execute(insert(Room), [
+        {'name': f'Room {i}', 'description': 'Benchmark room', 'price': 1500, 'capacity': 2,
+         'room_type': 'Double', 'total_rooms': 6, 'available': True, 'amenities': []}
+        for i in range(ROOMS)
+    ])
+    start = datetime(2024, 1, 1)
+    statuses = ['confirmed', 'confirmed', 'cancelled', 'pending']
+    rows = []
+    for i in range(bookings):
+        check_in = date(2024, 1, 1) + timedelta(days=random.randrange(900))
+        rows.append({
+            'room_id': random.randint(1, ROOMS),
+            'user_id': random.randint(1, USERS),
+            'guest_name': 'Guest',
+            'guest_email': 'guest@ssparadise.com',
+            'check_in': check_in,
+            'check_out': check_in + timedelta(days=random.randint(1, 5)),
+            'guests': 2,
+            'room_quantity': 1,
+            'created_at': start + timedelta(minutes=i),
+            'status': random.choice(statuses),
+            'payment_status': 'pending',
+            'payment_intent_id': f'pi_{i}'
+        })
+        if len(rows) == 5000:
+            db.session.execute(insert(Booking), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Booking), rows)
+    db.session.commit()
+
+def hot_queries():
+    check_in = date(2025, 6, 1)
+    check_out = date(2025, 6, 4)
+    cursor_at = datetime(2024, 3, 1)
+    return {
+        'overlap by room': select(func.sum(Booking.room_quantity)).where(
+            Booking.room_id == 7,
+            Booking.status == 'confirmed',
+            Booking.check_in < check_out,
+            Booking.check_out > check_in
+        ),
+        'my bookings': select(Booking.id).where(Booking.user_id == 42).order_by(Booking.created_at.desc()),
+        'payment intent lookup': select(Booking.id).where(Booking.payment_intent_id == 'pi_1234'),
+        'admin keyset page': select(Booking.id).where(or_(
+            Booking.created_at < cursor_at,
+            and_(Booking.created_at == cursor_at, Booking.id < 100)
+        )).order_by(Booking.created_at.desc(), Booking.id.desc()).limit(51),
+        'admin status filter': select(Booking.id).where(Booking.status == 'pending')
+            .order_by(Booking.created_at.desc(), Booking.id.desc()).limit(51),
+    }
+
+def explain(statement):
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(text(prefix + sql)).all()
+    return [str(row[-1]) for row in rows]
+
+def timed(statement, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        db.session.execute(statement).all()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def report(label):
+    print(f"\n=== {label} ===")
+    for name, statement in hot_queries().items():
+        print(f"\n{name}: {timed(statement):.3f} ms")
+        for line in explain(statement):
+            print(f"    {line}")
+
+def main():
+    bookings = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with app.app_context():
+        db.create_all()
+        print(f"Seeding {bookings} bookings...")
+        seed(bookings)
+
+        for index in Booking.__table__.indexes:
+            index.drop(bind=db.engine, checkfirst=True)
+        db.session.execute(text('ANALYZE'))
+        report('Without indexes')
+
+        created, failed = add_missing_indexes()
+        db.session.execute(text('ANALYZE'))
+        print(f"\nCreated indexes: {', '.join(created)}")
+        if failed:
+            print(f"Failed indexes: {', '.join(failed)}")
+        report('With indexes')
+
+if __name__ == "__main__":
+    main()
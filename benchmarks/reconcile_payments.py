@@ -0,0 +1,119 @@
+"""Payment reconciliation against a stubbed Stripe API.
+
+    python benchmarks/reconcile_payments.py [bookings] [drift_percent]
+
+Seeds a throwaway SQLite database with bookings and a local Stripe stub with
+their PaymentIntents and Refunds, corrupts a share of the bookings, runs
+payment.reconcile_payments and reports time, peak Python memory and how many
+rows were corrected (tracemalloc slows the timed passes noticeably). A second
+pass must find nothing left to fix.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+import stripe
+from sqlalchemy import insert
+from app import app, db
+from models import User, Room, Booking, RoomInventory
+from availability import rebuild_ledger
+from payment import reconcile_payments
+from stripe_stub import StripeStub
+
+def seed(bookings, drift_percent, stub):
+    db.session.add(User(email='bench@ssparadise.com', name='Bench', password_hash='x'))
+    db.session.add(Room(name='Bench Room', description='Benchmark room', price=1500, capacity=2,
+                        room_type='Double', total_rooms=bookings, amenities=[]))
+    db.session.commit()
+
+    created = int(time.time()) - 86400
+    drifted = 0
+    rows = []
+    for i in range(bookings):
+        intent_id = f'pi_{i:08d}'
+        status = random.choice(['succeeded', 'succeeded', 'succeeded', 'canceled', 'requires_payment_method'])
+        stub.add_payment_intent(intent_id, status, 300000, created + i)
+        refunded = status == 'succeeded' and random.random() < 0.1
+        if refunded:
+            stub.add_refund(f're_{i:08d}', intent_id, 150000, created + i + 1)
+
+        # What the booking would look like if every webhook had arrived
+        row = {
+            'room_id': 1, 'user_id': 1, 'guest_name': 'Guest', 'guest_email': 'guest@ssparadise.com',
+            'check_in': date(2030, 1, 1), 'check_out': date(2030, 1, 3), 'guests': 2, 'room_quantity': 1,
+            'payment_intent_id': intent_id, 'payment_option': 'now',
+            'status': 'confirmed' if status == 'succeeded' else 'pending',
+            'payment_status': {'succeeded': 'completed', 'canceled': 'failed'}.get(status, 'pending'),
+            'amount_paid': 3000 if status == 'succeeded' else None,
+            'payment_date': datetime.utcnow() if status == 'succeeded' else None,
+            'refund_status': 'completed' if refunded else None,
+            'refund_amount': 1500 if refunded else None,
+        }
+        if random.random() * 100 < drift_percent:
+            drifted += 1
+            if status == 'succeeded':
+                # Missed webhook or a refund that failed partway
+                row.update(status='pending', payment_status='pending', amount_paid=None, payment_date=None)
+                if refunded:
+                    row.update(refund_status=None, refund_amount=None)
+            else:
+                row.update(payment_status='completed', refund_status='completed', refund_amount=1500)
+        rows.append(row)
+        if len(rows) == 5000:
+            db.session.execute(insert(Booking), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Booking), rows)
+    rebuild_ledger()
+    db.session.commit()
+    return drifted
+
+def run(label):
+    tracemalloc.start()
+    started = time.perf_counter()
+    stats = reconcile_payments()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label}: {elapsed:.2f}s, peak {peak / 1024 / 1024:.1f} MiB, {stats}")
+    return stats
+
+def main():
+    bookings = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    drift_percent = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    stub = StripeStub()
+    stripe.api_base = stub.start()
+    stripe.api_key = 'sk_test_stub'
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"Seeding {bookings} bookings...")
+            drifted = seed(bookings, drift_percent, stub)
+            print(f"Drifted bookings: {drifted}")
+
+            first = run('First pass')
+            print(f"Stripe list requests: {stub.requests}")
+            second = run('Second pass')
+
+            ledger_booked = db.session.query(db.func.max(RoomInventory.booked)).scalar()
+            confirmed = Booking.query.filter_by(status='confirmed').count()
+            print(f"Confirmed bookings: {confirmed}, ledger booked per night: {ledger_booked}")
+    finally:
+        stub.stop()
+
+    if first['corrected'] != drifted or second['corrected'] or ledger_booked != confirmed:
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
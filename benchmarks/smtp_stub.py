@@ -0,0 +1,66 @@
+"""Minimal in-process SMTP sink used by the benchmarks.
+
+Speaks just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for
+smtplib and Flask-Mail to deliver to it, and counts the messages received.
+Setting failures makes that many upcoming messages fail with a temporary
+error at MAIL FROM. Point the app at it with SMTP_SERVER, SMTP_PORT and
+SMTP_USE_TLS=false.
+"""
+import socketserver
+import threading
+
+class SMTPStub:
+    def __init__(self):
+        self.messages = 0
+        self.connections = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                with stub.lock:
+                    stub.connections += 1
+                self.reply("220 localhost SMTP stub")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode(errors='replace').strip().upper()
+                    if command.startswith('EHLO'):
+                        self.wfile.write(b"250-localhost\r\n250 8BITMIME\r\n")
+                    elif command.startswith('MAIL') and stub.failures:
+                        with stub.lock:
+                            stub.failures -= 1
+                        self.reply("451 Temporary local problem")
+                    elif command.startswith('DATA'):
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                            pass
+                        with stub.lock:
+                            stub.messages += 1
+                        self.reply("250 OK")
+                    elif command.startswith('QUIT'):
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        # HELO, MAIL, RCPT, RSET and NOOP all succeed
+                        self.reply("250 OK")
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
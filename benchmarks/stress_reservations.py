@@ -0,0 +1,118 @@
+"""Concurrency stress test for the reservation path.
+
+Fires many parallel reservations at a single room type and checks that the
+inventory ledger never exceeds total_rooms on any night.
+
+    python benchmarks/stress_reservations.py [bookings] [workers] [total_rooms]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+from app import app, db
+from models import User, Room, Booking, RoomInventory
+from availability import reserve_booking, RoomUnavailable, stay_nights
+
+def setup(total_rooms):
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"stress-{os.getpid()}@ssparadise.com", name="Stress Test")
+        user.set_password("stress")
+        room = Room(
+            name="Stress Test Room",
+            description="Room used by the reservation stress test",
+            price=1000,
+            capacity=2,
+            room_type="Single",
+            total_rooms=total_rooms,
+            amenities=[]
+        )
+        db.session.add_all([user, room])
+        db.session.commit()
+        return user.id, room.id
+
+def attempt(user_id, room_id, index, results, lock):
+    # Overlapping stays of one to three nights all competing for the same week
+    check_in = date.today() + timedelta(days=30 + index % 5)
+    check_out = check_in + timedelta(days=1 + index % 3)
+    with app.app_context():
+        booking = Booking(
+            room_id=room_id,
+            user_id=user_id,
+            guest_name=f"Guest {index}",
+            guest_email=f"guest{index}@ssparadise.com",
+            check_in=check_in,
+            check_out=check_out,
+            guests=1,
+            room_quantity=1 + index % 2,
+            status='pending',
+            payment_status='pending'
+        )
+        try:
+            reserve_booking(booking, max_attempts=20)
+            outcome = 'reserved'
+        except RoomUnavailable:
+            outcome = 'full'
+        except Exception as e:
+            outcome = f'error: {e.__class__.__name__}'
+        finally:
+            db.session.remove()
+    with lock:
+        results[outcome] = results.get(outcome, 0) + 1
+
+def verify(room_id, total_rooms):
+    with app.app_context():
+        occupancy = {}
+        bookings = Booking.query.filter_by(room_id=room_id).filter(Booking.status.in_(['pending', 'confirmed'])).all()
+        for booking in bookings:
+            for night in stay_nights(booking.check_in, booking.check_out):
+                occupancy[night] = occupancy.get(night, 0) + booking.room_quantity
+
+        ledger = {
+            row.night: row.held + row.booked
+            for row in RoomInventory.query.filter_by(room_id=room_id).all()
+        }
+        oversold = {night: count for night, count in occupancy.items() if count > total_rooms}
+        drift = {
+            night: (occupancy.get(night, 0), ledger.get(night, 0))
+            for night in set(occupancy) | set(ledger)
+            if occupancy.get(night, 0) != ledger.get(night, 0)
+        }
+        return oversold, drift
+
+def main():
+    bookings = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    total_rooms = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+
+    user_id, room_id = setup(total_rooms)
+    results = {}
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for index in range(bookings):
+            pool.submit(attempt, user_id, room_id, index, results, lock)
+
+    oversold, drift = verify(room_id, total_rooms)
+    print(f"Attempts: {bookings}, workers: {workers}, total rooms: {total_rooms}")
+    for outcome, count in sorted(results.items()):
+        print(f"  {outcome}: {count}")
+    print(f"Oversold nights: {len(oversold)}")
+    print(f"Ledger drift: {len(drift)}")
+
+    if oversold or drift or any(outcome.startswith('error') for outcome in results):
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
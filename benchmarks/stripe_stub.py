@@ -0,0 +1,106 @@
+"""Minimal in-process stand-in for the Stripe API used by the benchmarks.
+
+Serves paginated GET lists for /v1/payment_intents and /v1/refunds from
+in-memory objects, following Stripe's limit/starting_after/has_more
+contract so auto_paging_iter works against it, and POST
+/v1/payment_intents/<id>/cancel. Point the app at it with STRIPE_API_BASE
+(see payment.py).
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class StripeStub:
+    def __init__(self):
+        self.objects = {'payment_intents': [], 'refunds': []}
+        self.sorted = {}
+        self.requests = 0
+        self.server = None
+
+    def add_payment_intent(self, intent_id, status, amount, created):
+        self.objects['payment_intents'].append({
+            'id': intent_id, 'object': 'payment_intent', 'status': status,
+            'amount': amount, 'amount_received': amount if status == 'succeeded' else 0,
+            'currency': 'inr', 'created': created
+        })
+        self.sorted.pop('payment_intents', None)
+
+    def add_refund(self, refund_id, payment_intent, amount, created, status='succeeded'):
+        self.objects['refunds'].append({
+            'id': refund_id, 'object': 'refund', 'status': status,
+            'amount': amount, 'payment_intent': payment_intent, 'created': created
+        })
+        self.sorted.pop('refunds', None)
+
+    def cancel_payment_intent(self, intent_id):
+        """Cancel an intent like Stripe does; returns (status code, body)"""
+        for intent in self.objects['payment_intents']:
+            if intent['id'] == intent_id:
+                if intent['status'] in ('succeeded', 'canceled'):
+                    return 400, {'error': {'type': 'invalid_request_error',
+                                           'message': f"PaymentIntent has a status of {intent['status']}"}}
+                intent['status'] = 'canceled'
+                return 200, intent
+        return 404, {'error': {'type': 'invalid_request_error', 'message': f'No such payment_intent: {intent_id}'}}
+
+    def page(self, resource, query):
+        # Stripe lists newest first and pages with starting_after=<last id seen>
+        if resource not in self.sorted:
+            items = sorted(self.objects[resource], key=lambda item: item['created'], reverse=True)
+            self.sorted[resource] = (items, {item['id']: i for i, item in enumerate(items)})
+        items, positions = self.sorted[resource]
+        start = positions.get(query['starting_after'], len(items)) + 1 if 'starting_after' in query else 0
+        created_gte = int(query.get('created[gte]', 0))
+        limit = int(query.get('limit', 10))
+        data = []
+        for index in range(start, len(items)):
+            item = items[index]
+            if item['created'] < created_gte:
+                break
+            if len(data) == limit:
+                return {'object': 'list', 'url': f'/v1/{resource}', 'data': data, 'has_more': True}
+            data.append(item)
+        return {'object': 'list', 'url': f'/v1/{resource}', 'data': data, 'has_more': False}
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stub.requests += 1
+                url = urlparse(self.path)
+                resource = url.path.rstrip('/').rsplit('/', 1)[-1]
+                if resource not in stub.objects:
+                    self.send_error(404)
+                    return
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                self.respond(200, stub.page(resource, query))
+
+            def do_POST(self):
+                stub.requests += 1
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                parts = urlparse(self.path).path.strip('/').split('/')
+                if len(parts) == 4 and parts[1] == 'payment_intents' and parts[3] == 'cancel':
+                    self.respond(*stub.cancel_payment_intent(parts[2]))
+                    return
+                self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
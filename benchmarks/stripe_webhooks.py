@@ -0,0 +1,140 @@
+"""Check of the Stripe webhook endpoint and event worker with locally signed events.
+
+    python benchmarks/stripe_webhooks.py
+
+Signs events the way Stripe does (HMAC-SHA256 over "<timestamp>.<payload>")
+and posts them to /stripe/webhook. Checks that missing, forged, wrongly
+keyed and stale signatures are rejected without storing anything, that a
+redelivered event id is stored once, and that process_stripe_events applies
+a batch in one pass: held bookings are confirmed, their rooms move from held
+to booked, refunds are recorded and every event is marked processed. Uses a
+throwaway SQLite database.
+"""
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WEBHOOK_SECRET = 'whsec_check'
+os.environ['STRIPE_WEBHOOK_SECRET'] = WEBHOOK_SECRET
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+
+from sqlalchemy import func
+from app import app, db
+from models import User, Room, Booking, RoomInventory, StripeEvent
+from availability import reserve_booking
+from payment import process_stripe_events
+
+CHECK_IN, CHECK_OUT = date(2030, 3, 1), date(2030, 3, 3)
+
+failures = []
+
+def check(condition, message):
+    print(f"{'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+def event_payload(event_id, event_type, obj):
+    return json.dumps({'id': event_id, 'object': 'event', 'type': event_type, 'data': {'object': obj}})
+
+def succeeded(intent_id):
+    return event_payload(f'evt_{intent_id}', 'payment_intent.succeeded', {
+        'id': intent_id, 'object': 'payment_intent', 'amount': 300000,
+        'amount_received': 300000, 'created': int(time.time())
+    })
+
+def signature_header(payload, secret=WEBHOOK_SECRET, timestamp=None):
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+def post(client, payload, signature):
+    headers = {'Content-Type': 'application/json'}
+    if signature:
+        headers['Stripe-Signature'] = signature
+    return client.post('/stripe/webhook', data=payload, headers=headers)
+
+def seed():
+    user = User(email='webhook@ssparadise.com', name='Webhook Guest', password_hash='x')
+    room = Room(name='Webhook Room', description='Check room', price=1500, capacity=2,
+                room_type='Double', total_rooms=5, amenities=['Free Wi-Fi'])
+    db.session.add_all([user, room])
+    db.session.commit()
+    bookings = []
+    for i in range(3):
+        bookings.append(reserve_booking(Booking(
+            room_id=room.id, user_id=user.id, guest_name=f'Guest {i}', guest_email=f'guest{i}@ssparadise.com',
+            check_in=CHECK_IN, check_out=CHECK_OUT, guests=1, room_quantity=1, status='pending',
+            payment_status='pending', payment_option='now', payment_intent_id=f'pi_check_{i}'
+        )))
+    return room, bookings
+
+def ledger(room):
+    return db.session.query(func.sum(RoomInventory.held), func.sum(RoomInventory.booked)).filter(
+        RoomInventory.room_id == room.id).one()
+
+def main():
+    with app.app_context():
+        db.create_all()
+        room, bookings = seed()
+        client = app.test_client()
+
+        # Anything not signed with the configured secret is rejected and not stored
+        payload = succeeded('pi_check_0')
+        rejected = [
+            ('a missing signature', None),
+            ('a forged signature', f't={int(time.time())},v1={"0" * 64}'),
+            ('a signature made with another secret', signature_header(payload, secret='whsec_test')),
+            ('a replayed signature older than the tolerance', signature_header(payload, timestamp=int(time.time()) - 3600)),
+        ]
+        for name, signature in rejected:
+            check(post(client, payload, signature).status_code == 400, f"{name} is rejected")
+        tampered = payload.replace('300000', '1')
+        check(post(client, tampered, signature_header(payload)).status_code == 400, "a tampered payload is rejected")
+        check(StripeEvent.query.count() == 0, "rejected deliveries store nothing")
+
+        # Stripe redelivers events; the event id is stored once
+        for booking in bookings:
+            response = post(client, succeeded(booking.payment_intent_id), signature_header(succeeded(booking.payment_intent_id)))
+            check(response.status_code == 200 and not response.get_json().get('duplicate'),
+                  f"event for {booking.payment_intent_id} is accepted")
+        first = succeeded('pi_check_0')
+        response = post(client, first, signature_header(first))
+        check(response.status_code == 200 and response.get_json().get('duplicate'), "a redelivered event id is reported as a duplicate")
+        ignored = event_payload('evt_customer', 'customer.created', {'id': 'cus_1', 'object': 'customer'})
+        check(post(client, ignored, signature_header(ignored)).get_json().get('ignored'), "unhandled event types are acknowledged and dropped")
+        check(StripeEvent.query.count() == 3, "each event is stored once")
+        check(all(b.status == 'pending' for b in Booking.query.all()), "the endpoint does not touch bookings")
+
+        # The worker applies the stored batch in one pass
+        check(tuple(ledger(room)) == (6, 0), "the pending bookings hold their rooms before processing")
+        check(process_stripe_events() == 3, "process_stripe_events claims the whole batch")
+        db.session.expire_all()
+        check(all(b.status == 'confirmed' and b.payment_status == 'completed' and b.amount_paid == 3000
+                  for b in Booking.query.all()), "every paid booking is confirmed and marked completed")
+        check(tuple(ledger(room)) == (0, 6), "rooms move from held to booked")
+        check(StripeEvent.query.filter(StripeEvent.processed_at.is_(None)).count() == 0, "every event is marked processed")
+        check(process_stripe_events() == 0, "processed events are not applied again")
+
+        refund = event_payload('evt_refund_0', 'charge.refunded', {
+            'id': 'ch_check_0', 'object': 'charge', 'payment_intent': 'pi_check_0', 'amount_refunded': 150000
+        })
+        post(client, refund, signature_header(refund))
+        process_stripe_events()
+        db.session.expire_all()
+        refunded = Booking.query.filter_by(payment_intent_id='pi_check_0').one()
+        check(refunded.refund_status == 'completed' and refunded.refund_amount == 1500, "a refund event is recorded on its booking")
+
+    if failures:
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Fingerprint, precompress and resize the files under static/ into static/dist/.
+
+CSS and JS get gzip and (with the brotli package) brotli copies next to
+them; photos get WebP and JPEG copies at each of assets.IMAGE_WIDTHS. The
+manifest written last maps each source path to its output, and is what
+asset_url() and asset_image() read at startup. Files from earlier builds are
+kept so pages cached with old names still load; pass --clean to drop them.
+
+Run it in the deploy's build step, not at start-up: a cold build of the image
+variants takes around 15 seconds. Heroku runs it from bin/post_compile; on Render
+set the Build Command to "pip install -r requirements.txt && python build_assets.py".
+Without a build the app serves the plain files from /static.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+from PIL import Image
+from assets import DIST_DIR, IMAGE_SETTINGS, STATIC_DIR, content_hash, fingerprinted, write_image_variants
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt')
+IMAGES = ('.jpg', '.jpeg', '.png', '.webp')
+
+def source_files():
+    """Paths under static/ relative to it, leaving out earlier build output"""
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if os.path.abspath(root) == STATIC_DIR and 'dist' in dirs:
+            dirs.remove('dist')
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, '/')
+
+def write_once(path, data):
+    target = os.path.join(DIST_DIR, path)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+
+def precompress(path, data):
+    """Write .gz and .br copies that are smaller than data; returns their encodings"""
+    encodings = []
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        write_once(path + '.gz', compressed)
+        encodings.append('gzip')
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            write_once(path + '.br', compressed)
+            encodings.append('br')
+    return encodings
+
+def build_assets(clean=False):
+    if clean and os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    if brotli is None:
+        print("brotli is not installed; writing gzip copies only")
+
+    manifest = {'files': {}, 'images': {}, 'compressed': {}}
+    for path in source_files():
+        with open(os.path.join(STATIC_DIR, path), 'rb') as f:
+            data = f.read()
+        digest = content_hash(data)
+        built = fingerprinted(path, digest)
+        write_once(built, data)
+        manifest['files'][path] = built
+
+        ext = os.path.splitext(path)[1].lower()
+        if ext in COMPRESSIBLE:
+            encodings = precompress(built, data)
+            if encodings:
+                manifest['compressed'][built] = encodings
+        elif ext in IMAGES:
+            name = os.path.splitext(path)[0] + '.' + content_hash(data, IMAGE_SETTINGS)
+            with Image.open(os.path.join(STATIC_DIR, path)) as image:
+                manifest['images'][path] = write_image_variants(image, name, DIST_DIR)
+        print(f"{path} -> {built}")
+
+    # Written last, so a running app never sees names that do not exist yet
+    manifest_path = os.path.join(DIST_DIR, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    print(f"Built {len(manifest['files'])} assets and {len(manifest['images'])} responsive images.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clean', action='store_true', help='remove earlier build output first')
+    build_assets(parser.parse_args().clean)
@@ -0,0 +1,122 @@
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+class Cache(ABC):
+    """Interface shared by the cache backends."""
+
+    @abstractmethod
+    def get(self, key, default=None):
+        """Return the value stored for key, or default when missing or expired."""
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """Store value for ttl seconds, or the backend's default ttl."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove key if present."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every entry."""
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value for key, computing and storing it on a miss."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+class TTLCache(Cache):
+    """Thread-safe in-process cache with per-entry expiry and LRU eviction."""
+
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisCache(Cache):
+    """Cache stored in Redis and shared by every worker process.
+
+    Takes any client with redis-py's get/set/delete/scan_iter methods, so a
+    local stand-in can replace the server. Values are pickled; only the app
+    writes to this keyspace.
+    """
+
+    def __init__(self, client, ttl, prefix='ssparadise:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def get(self, key, default=None):
+        raw = self.client.get(self._key(key))
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self._key(key), pickle.dumps(value), ex=max(int(self.ttl if ttl is None else ttl), 1))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            self.client.delete(key)
+
+def make_cache(ttl, maxsize=1024, url=None, client=None, prefix='ssparadise:'):
+    """Return a RedisCache when a client or redis:// URL is given, else an in-process TTLCache."""
+    if client is None and url:
+        import redis
+        client = redis.Redis.from_url(url)
+    if client is not None:
+        return RedisCache(client, ttl, prefix)
+    return TTLCache(ttl, maxsize)
+
+# Callbacks run after a commit that inserted, changed or deleted bookings
+_booking_listeners = []
+
+def on_bookings_changed(func):
+    """Register func to be called whenever committed booking data changes."""
+    _booking_listeners.append(func)
+    return func
+
+def bookings_changed():
+    """Notify listeners that booking data changed outside the ORM (bulk updates)."""
+    for listener in _booking_listeners:
+        listener()
@@ -1,50 +1,102 @@
 import os
-from flask_mail import Mail, Message
-from flask import render_template_string, current_app
-from functools import wraps
+import threading
 import time
-from datetime import date, datetime
+from flask_mail import Mail, Message
+from flask import current_app
+from jinja2 import Environment
+from datetime import date, datetime, timedelta
+from metrics import external_call
 
 mail = Mail()
 
-def retry_on_failure(max_retries=3, delay=1):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    current_app.logger.error(f"Email sending attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == max_retries - 1:
-                        current_app.logger.error(f"All attempts failed for sending email: {str(e)}")
-                        return False
-                    time.sleep(delay)
+# Delivery attempts before an outbox email is marked failed
+MAX_DELIVERY_ATTEMPTS = 5
+# Base delay before retrying a failed delivery; doubles with every attempt
+RETRY_BACKOFF_SECONDS = 30
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions open so sends skip the TLS handshake and login.
+
+    Idle sessions are checked with NOOP before reuse and closed after max_idle
+    seconds, since Gmail drops connections that sit idle.
+    """
+
+    def __init__(self, max_size=2, max_idle=60):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return a live Flask-Mail connection, reusing an idle one when possible"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.max_idle and self._is_alive(connection):
+                return connection
+            self._close(connection)
+
+        connection = mail.connect()
+        connection.__enter__()
+        return connection
+
+    def release(self, connection, broken=False):
+        """Return a connection to the pool, or close it if broken or the pool is full"""
+        if not broken:
+            with self._lock:
+                if len(self._idle) < self.max_size:
+                    self._idle.append((connection, time.monotonic()))
+                    return
+        self._close(connection)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    @staticmethod
+    def _is_alive(connection):
+        if connection.host is None:
+            return True
+        try:
+            return connection.host.noop()[0] == 250
+        except Exception:
             return False
-        return wrapper
-    return decorator
+
+    @staticmethod
+    def _close(connection):
+        try:
+            if connection.host is not None:
+                connection.host.quit()
+        except Exception:
+            pass
+
+smtp_pool = SMTPConnectionPool()
 
 BOOKING_CONFIRMATION_TEMPLATE = '''
-Dear {{ booking.guest_name }},
+Dear {{ guest_name }},
 
 Thank you for choosing SS Paradise Residency! Your booking has been confirmed.
 
 Booking Details:
-- Booking ID: {{ booking.id }}
-- Check-in: {{ booking.check_in.strftime('%Y-%m-%d') if booking.check_in else 'N/A' }}
-- Check-out: {{ booking.check_out.strftime('%Y-%m-%d') if booking.check_out else 'N/A' }}
-- Number of Guests: {{ booking.guests }}
-- Total Amount: ₹{{ "%.2f"|format(booking.amount_paid if booking.amount_paid else (booking.room.price * (booking.check_out - booking.check_in).days)) }}
-- Payment Status: {{ booking.payment_status.title() }}
-- Payment Option: {{ "Pay Now" if booking.payment_option == 'now' else "Pay Later" }}
+- Booking ID: {{ booking_id }}
+- Check-in: {{ check_in }}
+- Check-out: {{ check_out }}
+- Number of Guests: {{ guests }}
+- Total Amount: ₹{{ "%.2f"|format(total_amount) }}
+- Payment Status: {{ payment_status }}
+- Payment Option: {{ payment_option }}
 
 Room Details:
-- Room Type: {{ booking.room.room_type }}
-- Capacity: {{ booking.room.capacity }} Guests
-- Amenities: {{ booking.room.amenities|join(', ') }}
-- Total Rooms Booked: {{ booking.room.bookings|selectattr('status', 'equalto', 'confirmed')|list|length }}/{{ booking.room.total_rooms }}
+- Room Type: {{ room_type }}
+- Capacity: {{ capacity }} Guests
+- Amenities: {{ amenities }}
+- Total Rooms Booked: {{ rooms_booked }}/{{ total_rooms }}
 
-{% if booking.payment_option == 'later' %}
+{% if pay_later %}
 Important: Payment must be completed before check-in.
 You can complete your payment through our website at any time.
 {% endif %}
@@ -68,26 +120,65 @@ Best regards,
 SS Paradise Residency Team
 '''
 
+BOOKING_CONFIRMATION_HTML_TEMPLATE = '''
+<p>Dear {{ guest_name }},</p>
+<p>Thank you for choosing SS Paradise Residency! Your booking has been confirmed.</p>
+<h3>Booking Details</h3>
+<ul>
+    <li>Booking ID: {{ booking_id }}</li>
+    <li>Check-in: {{ check_in }}</li>
+    <li>Check-out: {{ check_out }}</li>
+    <li>Number of Guests: {{ guests }}</li>
+    <li>Total Amount: &#8377;{{ "%.2f"|format(total_amount) }}</li>
+    <li>Payment Status: {{ payment_status }}</li>
+    <li>Payment Option: {{ payment_option }}</li>
+</ul>
+<h3>Room Details</h3>
+<ul>
+    <li>Room Type: {{ room_type }}</li>
+    <li>Capacity: {{ capacity }} Guests</li>
+    <li>Amenities: {{ amenities }}</li>
+    <li>Total Rooms Booked: {{ rooms_booked }}/{{ total_rooms }}</li>
+</ul>
+{% if pay_later %}
+<p><strong>Important:</strong> Payment must be completed before check-in.
+You can complete your payment through our website at any time.</p>
+{% endif %}
+<h3>Cancellation Policy</h3>
+<ul>
+    <li>More than 7 days before check-in: 10% cancellation fee</li>
+    <li>3-7 days before check-in: 30% cancellation fee</li>
+    <li>48-72 hours before check-in: 50% cancellation fee</li>
+    <li>Less than 48 hours before check-in: No refund available</li>
+</ul>
+<p>SS Paradise Residency<br>
+Near Arunachaleswarar Temple, Tiruvannamalai<br>
+ssparadisehotels@gmail.com &middot; +91 97895 39756<br>
+<a href="https://ssparadise.com">ssparadise.com</a></p>
+<p>Need assistance? Contact our 24/7 support desk.</p>
+<p>Best regards,<br>SS Paradise Residency Team</p>
+'''
+
 BOOKING_STATUS_UPDATE_TEMPLATE = '''
-Dear {{ booking.guest_name }},
+Dear {{ guest_name }},
 
 Your booking status has been updated.
 
 Booking Details:
-- Booking ID: {{ booking.id }}
-- Room: {{ booking.room.name }} ({{ booking.room.room_type }})
-- Check-in: {{ booking.check_in.strftime('%Y-%m-%d') if booking.check_in else 'N/A' }}
-- Check-out: {{ booking.check_out.strftime('%Y-%m-%d') if booking.check_out else 'N/A' }}
-- Number of Guests: {{ booking.guests }}
-- Current Status: {{ booking.status.title() }}
-- Payment Status: {{ booking.payment_status.title() }}
-
-{% if booking.status == 'cancelled' %}
+- Booking ID: {{ booking_id }}
+- Room: {{ room_name }} ({{ room_type }})
+- Check-in: {{ check_in }}
+- Check-out: {{ check_out }}
+- Number of Guests: {{ guests }}
+- Current Status: {{ status }}
+- Payment Status: {{ payment_status }}
+
+{% if cancelled %}
 Cancellation Details:
-- Cancellation Date: {{ booking.cancelled_at.strftime('%Y-%m-%d %H:%M') if booking.cancelled_at else 'N/A' }}
-- Cancellation Fee: ₹{{ "%.2f"|format(booking.cancellation_fee) if booking.cancellation_fee else 0.00 }}
-- Refund Amount: ₹{{ "%.2f"|format(booking.refund_amount_available) if booking.refund_amount_available else 0.00 }}
-- Refund Status: {{ booking.refund_status.title() if booking.refund_status else 'Pending' }}
+- Cancellation Date: {{ cancelled_at }}
+- Cancellation Fee: ₹{{ "%.2f"|format(cancellation_fee) }}
+- Refund Amount: ₹{{ "%.2f"|format(refund_amount) }}
+- Refund Status: {{ refund_status }}
 {% endif %}
 
 Hotel Information:
@@ -102,12 +193,123 @@ Best regards,
 SS Paradise Residency Team
 '''
 
+BOOKING_STATUS_UPDATE_HTML_TEMPLATE = '''
+<p>Dear {{ guest_name }},</p>
+<p>Your booking status has been updated.</p>
+<h3>Booking Details</h3>
+<ul>
+    <li>Booking ID: {{ booking_id }}</li>
+    <li>Room: {{ room_name }} ({{ room_type }})</li>
+    <li>Check-in: {{ check_in }}</li>
+    <li>Check-out: {{ check_out }}</li>
+    <li>Number of Guests: {{ guests }}</li>
+    <li>Current Status: {{ status }}</li>
+    <li>Payment Status: {{ payment_status }}</li>
+</ul>
+{% if cancelled %}
+<h3>Cancellation Details</h3>
+<ul>
+    <li>Cancellation Date: {{ cancelled_at }}</li>
+    <li>Cancellation Fee: &#8377;{{ "%.2f"|format(cancellation_fee) }}</li>
+    <li>Refund Amount: &#8377;{{ "%.2f"|format(refund_amount) }}</li>
+    <li>Refund Status: {{ refund_status }}</li>
+</ul>
+{% endif %}
+<p>SS Paradise Residency<br>
+Near Arunachaleswarar Temple, Tiruvannamalai<br>
+ssparadisehotels@gmail.com &middot; +91 97895 39756</p>
+<p>If you have any questions, please don't hesitate to contact us.</p>
+<p>Best regards,<br>SS Paradise Residency Team</p>
+'''
+
+ROOM_UPDATE_TEMPLATE = '''
+Dear {{ guest_name }},
+
+The details of the room you booked at SS Paradise Residency have been updated.
+
+Booking Details:
+- Booking ID: {{ booking_id }}
+- Room: {{ room_name }} ({{ room_type }})
+- Capacity: {{ capacity }} Guests
+- Check-in: {{ check_in }}
+- Check-out: {{ check_out }}
+
+{% if not room_available %}
+This room type is temporarily unavailable. Our team will contact you to arrange an alternative.
+{% endif %}
+
+Hotel Information:
+SS Paradise Residency
+Address: Near Arunachaleswarar Temple, Tiruvannamalai
+Email: ssparadisehotels@gmail.com
+Phone: +91 97895 39756
+
+If you have any questions, please don't hesitate to contact us.
+
+Best regards,
+SS Paradise Residency Team
+'''
+
+# Templates are compiled once at import; plain-text bodies are not HTML-escaped
+_text_env = Environment(autoescape=False, keep_trailing_newline=True)
+_html_env = Environment(autoescape=True, keep_trailing_newline=True)
+booking_confirmation_text = _text_env.from_string(BOOKING_CONFIRMATION_TEMPLATE)
+booking_confirmation_html = _html_env.from_string(BOOKING_CONFIRMATION_HTML_TEMPLATE)
+booking_status_update_text = _text_env.from_string(BOOKING_STATUS_UPDATE_TEMPLATE)
+booking_status_update_html = _html_env.from_string(BOOKING_STATUS_UPDATE_HTML_TEMPLATE)
+room_update_text = _text_env.from_string(ROOM_UPDATE_TEMPLATE)
+
+def _format_date(value, fmt='%Y-%m-%d'):
+    return value.strftime(fmt) if value else 'N/A'
+
+def booking_email_context(booking, room=None):
+    """Flatten a booking into the plain values the email templates need.
+
+    Rooms booked for the stay come from one aggregate query against the
+    inventory ledger instead of walking the room's booking history.
+    """
+    from availability import get_free_count
+
+    room = room or booking.room
+    nights = (booking.check_out - booking.check_in).days if booking.check_in and booking.check_out else 0
+    total_rooms = room.total_rooms or 0
+    if booking.check_in and booking.check_out:
+        rooms_booked = total_rooms - get_free_count(room.id, booking.check_in, booking.check_out)
+    else:
+        rooms_booked = 0
+
+    cancelled = booking.status == 'cancelled'
+    return {
+        'guest_name': booking.guest_name,
+        'booking_id': booking.id,
+        'check_in': _format_date(booking.check_in),
+        'check_out': _format_date(booking.check_out),
+        'guests': booking.guests,
+        'total_amount': booking.amount_paid or room.price * nights * (booking.room_quantity or 1),
+        'status': (booking.status or '').title(),
+        'payment_status': (booking.payment_status or '').title(),
+        'payment_option': 'Pay Now' if booking.payment_option == 'now' else 'Pay Later',
+        'pay_later': booking.payment_option == 'later',
+        'room_name': room.name,
+        'room_type': room.room_type,
+        'room_available': room.available,
+        'capacity': room.capacity,
+        'amenities': ', '.join(room.amenities or []),
+        'rooms_booked': rooms_booked,
+        'total_rooms': total_rooms,
+        'cancelled': cancelled,
+        'cancelled_at': _format_date(booking.cancelled_at, '%Y-%m-%d %H:%M'),
+        'cancellation_fee': booking.cancellation_fee if cancelled else 0,
+        'refund_amount': booking.refund_amount_available if cancelled else 0,
+        'refund_status': booking.refund_status.title() if booking.refund_status else 'Pending'
+    }
+
 def init_mail_app(app):
     """Initialize mail settings for the Flask app"""
     try:
-        app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-        app.config['MAIL_PORT'] = 587
-        app.config['MAIL_USE_TLS'] = True
+        app.config['MAIL_SERVER'] = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
+        app.config['MAIL_PORT'] = int(os.environ.get('SMTP_PORT', 587))
+        app.config['MAIL_USE_TLS'] = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
         app.config['MAIL_USERNAME'] = os.environ.get('SMTP_USERNAME', 'ssparadisehotels@gmail.com')
         app.config['MAIL_PASSWORD'] = os.environ.get('SMTP_PASSWORD')
         app.config['MAIL_DEFAULT_SENDER'] = ('SS Paradise Residency', 'ssparadisehotels@gmail.com')
@@ -133,52 +335,59 @@ def log_email_delivery(recipient, cc_list, success, error=None):
         if error:
             current_app.logger.error(f"Error details: {str(error)}")
 
-@retry_on_failure(max_retries=3, delay=1)
-def send_booking_confirmation(booking):
-    """Send booking confirmation email with enhanced error handling and logging"""
+def queue_email(subject, recipients, body, html=None, cc=None, booking_id=None, commit=True):
+    """Store an email in the outbox for worker.py to deliver"""
+    from app import db
+    from models import EmailOutbox
+
+    email = EmailOutbox(
+        booking_id=booking_id,
+        subject=subject,
+        recipients=recipients,
+        cc=cc or [],
+        body=body,
+        html_body=html
+    )
+    db.session.add(email)
+    if commit:
+        db.session.commit()
+    return email
+
+def queue_booking_confirmation(booking):
+    """Queue the booking confirmation email for background delivery"""
     cc_list = ['ssparadisehotels@gmail.com']
-    success = False
-    
+
     try:
         # Validate email addresses and booking data
         if not booking.guest_email:
             raise ValueError("Guest email is required")
         if not booking.check_in or not booking.check_out:
             raise ValueError("Invalid booking dates")
-        
-        msg = Message(
+
+        context = booking_email_context(booking)
+        queue_email(
             'Booking Confirmation - SS Paradise Residency',
-            recipients=[booking.guest_email],
-            cc=cc_list
+            [booking.guest_email],
+            booking_confirmation_text.render(context),
+            html=booking_confirmation_html.render(context),
+            cc=cc_list,
+            booking_id=booking.id
         )
-        msg.body = render_template_string(BOOKING_CONFIRMATION_TEMPLATE, booking=booking)
-        
-        # Send email and handle potential errors
-        try:
-            mail.send(msg)
-            success = True
-            log_email_delivery(booking.guest_email, cc_list, True)
-        except Exception as send_error:
-            log_email_delivery(booking.guest_email, cc_list, False, send_error)
-            raise send_error
-            
-        return success
-        
+        return True
+
     except Exception as e:
-        current_app.logger.error(f"Error in send_booking_confirmation: {str(e)}")
-        raise
+        current_app.logger.error(f"Error in queue_booking_confirmation: {str(e)}")
+        return False
 
-@retry_on_failure(max_retries=3, delay=1)
-def send_booking_status_update(booking):
-    """Send booking status update email with enhanced error handling and logging"""
+def queue_booking_status_update(booking):
+    """Queue the booking status update email for background delivery"""
     cc_list = ['ssparadisehotels@gmail.com']
-    success = False
-    
+
     try:
         # Validate email addresses
         if not booking.guest_email:
             raise ValueError("Guest email is required")
-            
+
         # Validate dates before using them
         if not isinstance(booking.check_in, date):
             current_app.logger.warning(f"Invalid check_in date for booking {booking.id}")
@@ -186,25 +395,105 @@ def send_booking_status_update(booking):
             current_app.logger.warning(f"Invalid check_out date for booking {booking.id}")
         if booking.status == 'cancelled' and not isinstance(booking.cancelled_at, datetime):
             current_app.logger.warning(f"Invalid cancellation date for booking {booking.id}")
-        
-        msg = Message(
+
+        context = booking_email_context(booking)
+        queue_email(
             'Booking Status Update - SS Paradise Residency',
-            recipients=[booking.guest_email],
-            cc=cc_list
+            [booking.guest_email],
+            booking_status_update_text.render(context),
+            html=booking_status_update_html.render(context),
+            cc=cc_list,
+            booking_id=booking.id
         )
-        msg.body = render_template_string(BOOKING_STATUS_UPDATE_TEMPLATE, booking=booking)
-        
-        # Send email and handle potential errors
-        try:
-            mail.send(msg)
-            success = True
-            log_email_delivery(booking.guest_email, cc_list, True)
-        except Exception as send_error:
-            log_email_delivery(booking.guest_email, cc_list, False, send_error)
-            raise send_error
-            
-        return success
-        
+        return True
+
     except Exception as e:
-        current_app.logger.error(f"Error in send_booking_status_update: {str(e)}")
-        raise
+        current_app.logger.error(f"Error in queue_booking_status_update: {str(e)}")
+        return False
+
+def queue_room_update_notices(room):
+    """Queue a notice to every guest with an upcoming confirmed stay in this room.
+
+    All notices are committed together and later delivered by the worker over
+    one pooled SMTP session.
+    """
+    from app import db
+    from models import Booking
+
+    bookings = Booking.query.filter(
+        Booking.room_id == room.id,
+        Booking.status == 'confirmed',
+        Booking.check_out >= date.today()
+    ).all()
+
+    for booking in bookings:
+        queue_email(
+            'Room Update - SS Paradise Residency',
+            [booking.guest_email],
+            room_update_text.render(
+                guest_name=booking.guest_name,
+                booking_id=booking.id,
+                room_name=room.name,
+                room_type=room.room_type,
+                room_available=room.available,
+                capacity=room.capacity,
+                check_in=_format_date(booking.check_in),
+                check_out=_format_date(booking.check_out)
+            ),
+            booking_id=booking.id,
+            commit=False
+        )
+    db.session.commit()
+    return len(bookings)
+
+def deliver_outbox(batch_size=100):
+    """Send due outbox emails, rescheduling failures with exponential backoff.
+
+    Returns the number of emails attempted. Rows are claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED on Postgres so several workers can drain
+    the outbox without sending the same email twice.
+    """
+    from app import db
+    from models import EmailOutbox
+
+    now = datetime.utcnow()
+    emails = EmailOutbox.query.filter(
+        EmailOutbox.status == 'pending',
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.id).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    # The whole batch goes out over one pooled SMTP session; a session that
+    # errors is discarded and the next email opens a fresh one
+    connection = None
+    for email in emails:
+        email.attempts += 1
+        try:
+            if connection is None:
+                connection = smtp_pool.acquire()
+            with external_call('smtp', 'send'):
+                connection.send(Message(
+                    email.subject,
+                    recipients=email.recipients,
+                    cc=email.cc,
+                    body=email.body,
+                    html=email.html_body
+                ))
+            email.status = 'sent'
+            email.sent_at = datetime.utcnow()
+            email.last_error = None
+            log_email_delivery(email.recipients[0], email.cc or [], True)
+        except Exception as e:
+            if connection is not None:
+                smtp_pool.release(connection, broken=True)
+                connection = None
+            log_email_delivery(email.recipients[0], email.cc or [], False, e)
+            email.last_error = str(e)
+            if email.attempts >= MAX_DELIVERY_ATTEMPTS:
+                email.status = 'failed'
+            else:
+                email.next_attempt_at = now + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (email.attempts - 1))
+    if connection is not None:
+        smtp_pool.release(connection)
+
+    db.session.commit()
+    return len(emails)
@@ -0,0 +1,18 @@
+import os
+import shutil
+import tempfile
+
+# Must be set before prometheus_client is imported so every worker writes
+# its samples to files that /metrics can merge
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "ssparadise-metrics"))
+
+from prometheus_client import multiprocess
+
+def on_starting(server):
+    """Start each deploy with empty metric files"""
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,73 @@
+import hashlib
+import os
+from datetime import date
+from functools import wraps
+from flask import Response, g, make_response, request, session
+from flask_login import current_user
+
+_salt = ''
+
+def init_http_cache(app):
+    """Configure the validators sent by views wrapped in conditional_get"""
+    global _salt
+    # Mixed into every ETag. Change it on deploys that alter templates so
+    # clients stop revalidating pages rendered by the old ones.
+    app.config['HTTP_CACHE_SALT'] = os.environ.get('HTTP_CACHE_SALT', '')
+    _salt = app.config['HTTP_CACHE_SALT']
+
+def conditional_get(etag_func, max_age=0, per_user=True):
+    """Answer GETs with a weak ETag and 304 Not Modified when the client is current.
+
+    etag_func takes the view's arguments and returns a cheap fingerprint of
+    everything the response depends on, usually Room.version and
+    Room.inventory_version, or None to skip validation (e.g. an unknown id,
+    which the view turns into a 404). The view only runs when the client's
+    copy is stale, so a 304 costs the fingerprint query alone. Wrap views
+    that use cached_page or cached_fragment so their cache keys include the
+    fingerprint.
+
+    Pages that differ per user (per_user) are public for anonymous visitors
+    and private, always revalidated, for logged-in ones. max_age applies to
+    public responses. Requests with pending flash messages are not validated,
+    so the messages are rendered rather than lost to a 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(**kwargs)
+            fingerprint = etag_func(**kwargs)
+            if fingerprint is None:
+                return view(**kwargs)
+            # Pages and fragments cached while rendering are keyed by this too
+            # (see page_cache.py), so a cached body always matches its ETag
+            g.cache_fingerprint = f"{date.today().isoformat()}:{fingerprint}"
+            if session.get('_flashes'):
+                return view(**kwargs)
+
+            private = per_user and current_user.is_authenticated
+            parts = [_salt, request.endpoint, g.cache_fingerprint]
+            if private:
+                # base.html renders the user's name and, for admins, the Admin menu
+                parts.append(f"u{current_user.id}:{int(bool(current_user.is_admin))}:{current_user.name}")
+            etag = hashlib.sha1(':'.join(parts).encode()).hexdigest()[:20]
+
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if private:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            else:
+                response.cache_control.public = True
+                response.cache_control.max_age = max_age
+            if per_user:
+                response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,24 @@
+from app import app, db
+from models import Room
+from page_cache import invalidate_room
+from room_images import ingest_image_url, InvalidImage
+
+def ingest_room_images():
+    """Copy remote image_url photos (e.g. the seeded Unsplash ones) into local storage"""
+    with app.app_context():
+        rooms = Room.query.filter(Room.image_url.isnot(None), Room.image_url != '', Room.image_variants.is_(None)).order_by(Room.id).all()
+        stored = 0
+        for room in rooms:
+            try:
+                ingest_image_url(room, room.image_url)
+                db.session.commit()
+                invalidate_room(room.id)
+                stored += 1
+                print(f"{room.name}: stored {room.image_width}x{room.image_height}")
+            except InvalidImage as e:
+                db.session.rollback()
+                print(f"{room.name}: skipped, {e}")
+        print(f"Stored images for {stored} of {len(rooms)} rooms.")
+
+if __name__ == "__main__":
+    ingest_room_images()
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import observe_request
+
+# Per-endpoint totals since the process started, keyed by Flask endpoint name
+_endpoint_stats = {}
+_stats_lock = threading.Lock()
+
+def endpoint_stats():
+    """Return a snapshot of per-endpoint request, query and timing totals"""
+    with _stats_lock:
+        snapshot = {endpoint: dict(stats) for endpoint, stats in _endpoint_stats.items()}
+    for stats in snapshot.values():
+        for key in ('db_ms', 'total_ms', 'max_total_ms'):
+            stats[key] = round(stats[key], 2)
+        stats['avg_queries'] = round(stats['queries'] / stats['requests'], 2)
+        stats['avg_db_ms'] = round(stats['db_ms'] / stats['requests'], 2)
+        stats['avg_total_ms'] = round(stats['total_ms'] / stats['requests'], 2)
+    return snapshot
+
+def record_request(endpoint, queries, db_ms, total_ms):
+    with _stats_lock:
+        stats = _endpoint_stats.setdefault(endpoint, {
+            'requests': 0, 'queries': 0, 'db_ms': 0.0, 'total_ms': 0.0, 'max_queries': 0, 'max_total_ms': 0.0
+        })
+        stats['requests'] += 1
+        stats['queries'] += queries
+        stats['db_ms'] += db_ms
+        stats['total_ms'] += total_ms
+        stats['max_queries'] = max(stats['max_queries'], queries)
+        stats['max_total_ms'] = max(stats['max_total_ms'], total_ms)
+
+def init_instrumentation(app):
+    """Count SQL statements and time them per request, and log slow queries"""
+    # Statements slower than this are logged with their bound parameters
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+    # Requests issuing more statements than this are logged as likely N+1 patterns
+    app.config['QUERY_COUNT_WARNING'] = int(os.environ.get('QUERY_COUNT_WARNING', 30))
+    # X-Query-Count, X-DB-Time-Ms and Server-Timing headers; on whenever debug is
+    app.config.setdefault('QUERY_STATS_HEADERS', os.environ.get('QUERY_STATS_HEADERS', '').lower() == 'true')
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+            g.query_ms = g.get('query_ms', 0.0) + elapsed
+        if elapsed >= app.config['SLOW_QUERY_MS']:
+            app.logger.warning(f"Slow query ({elapsed:.1f} ms): {statement} {parameters!r}")
+
+    @event.listens_for(Engine, 'handle_error')
+    def discard_query_timer(context):
+        # A failed statement never reaches after_cursor_execute
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.query_ms = 0.0
+
+    @app.after_request
+    def finish_request_timer(response):
+        if 'request_started' not in g:
+            return response
+        total_ms = (time.perf_counter() - g.request_started) * 1000
+        endpoint = request.endpoint or 'unmatched'
+        record_request(endpoint, g.query_count, g.query_ms, total_ms)
+        observe_request(endpoint, request.method, response.status_code, total_ms / 1000)
+
+        if g.query_count > app.config['QUERY_COUNT_WARNING']:
+            app.logger.warning(f"{endpoint} issued {g.query_count} queries ({g.query_ms:.1f} ms) for {request.path}")
+
+        if app.debug or app.config['QUERY_STATS_HEADERS']:
+            response.headers['X-Query-Count'] = str(g.query_count)
+            response.headers['X-DB-Time-Ms'] = f"{g.query_ms:.2f}"
+            response.headers['X-Response-Time-Ms'] = f"{total_ms:.2f}"
+            response.headers['Server-Timing'] = f"db;dur={g.query_ms:.2f}, total;dur={total_ms:.2f}"
+        return response
+
+    @app.teardown_request
+    def count_failed_request(exc):
+        # Unhandled exceptions skip after_request; count them as 500s
+        if exc is not None and 'request_started' in g:
+            total_ms = (time.perf_counter() - g.request_started) * 1000
+            observe_request(request.endpoint or 'unmatched', request.method, 500, total_ms / 1000)
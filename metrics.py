@@ -0,0 +1,62 @@
+import os
+import time
+from contextlib import contextmanager
+from flask import Response, abort, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+# Under gunicorn every worker process writes its samples to files in
+# PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) and /metrics merges them.
+# worker.py records SMTP, Stripe and booking expiry/confirmation samples in its
+# own process and serves them on WORKER_METRICS_PORT, a second scrape target
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by Flask endpoint',
+    ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUESTS = Counter('http_requests_total', 'Requests by Flask endpoint and status', ['endpoint', 'method', 'status'])
+BOOKINGS = Counter('bookings_total', 'Booking lifecycle events', ['event'])
+EXTERNAL_CALL_LATENCY = Histogram(
+    'external_call_duration_seconds', 'Latency of SMTP and Stripe calls',
+    ['service', 'operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+EXTERNAL_CALL_ERRORS = Counter('external_call_errors_total', 'Failed SMTP and Stripe calls', ['service', 'operation'])
+
+def observe_request(endpoint, method, status, seconds):
+    REQUEST_LATENCY.labels(endpoint, method).observe(seconds)
+    REQUESTS.labels(endpoint, method, str(status)).inc()
+
+def record_booking_events(events):
+    """Count booking events, given as {event: count}"""
+    for name, count in events.items():
+        BOOKINGS.labels(name).inc(count)
+
+@contextmanager
+def external_call(service, operation):
+    """Time a call to an outside service, counting it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_CALL_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        EXTERNAL_CALL_LATENCY.labels(service, operation).observe(time.perf_counter() - started)
+
+def init_metrics(app):
+    """Expose Prometheus metrics at /metrics, optionally behind METRICS_TOKEN"""
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,158 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from app import app, db
+from availability import LEDGER_COLUMNS, rebuild_ledger
+from models import Booking, RoomInventory, reconcile_room_ratings
+import models
+
+# Columns whose values are derived from other tables, recomputed by these
+# functions when the column is first added (server defaults are only a placeholder)
+BACKFILLS = {
+    'room.rating_sum': reconcile_room_ratings,
+    'room.rating_count': reconcile_room_ratings,
+}
+
+# pg_advisory_xact_lock key serializing ledger backfills across processes
+LEDGER_BACKFILL_LOCK = 7120422
+
+# Indexes superseded by another one, dropped once their replacement exists
+REPLACED_INDEXES = {
+    'review': {'ix_review_user_room': 'ux_review_user_room'},
+}
+
+def add_missing_columns():
+    """Add columns declared on the models that existing tables do not have yet.
+
+    db.create_all() only creates missing tables, so new columns on existing
+    tables are added here with ALTER TABLE. This also runs when the app is
+    imported, so several gunicorn workers may race to add the same column;
+    a column that another process added first is skipped. Derived columns
+    listed in BACKFILLS are filled in before this returns.
+    """
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = (f"ALTER TABLE {preparer.format_table(table)} "
+                   f"ADD COLUMN {preparer.format_column(column)} "
+                   f"{column.type.compile(dialect=db.engine.dialect)}")
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(text(ddl))
+            except DBAPIError:
+                if column.name in {c['name'] for c in inspect(db.engine).get_columns(table.name)}:
+                    continue
+                raise
+            added.append(f"{table.name}.{column.name}")
+
+    backfills = {BACKFILLS[column] for column in added if column in BACKFILLS}
+    for backfill in backfills:
+        backfill()
+    if backfills:
+        db.session.commit()
+    return added
+
+def add_missing_indexes():
+    """Create indexes declared on the models that existing tables do not have yet.
+
+    Returns (created, failed) lists of index names. A unique index fails to
+    build when the table already holds duplicate values; those are reported
+    instead of aborting the migration.
+    """
+    inspector = inspect(db.engine)
+    created = []
+    failed = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=db.engine)
+                created.append(index.name)
+            except Exception as e:
+                app.logger.error(f"Error creating index {index.name}: {str(e)}")
+                failed.append(index.name)
+    return created, failed
+
+def drop_replaced_indexes():
+    """Drop the indexes in REPLACED_INDEXES whose replacement has been created.
+
+    An old index is kept while its replacement is missing, e.g. when a unique
+    index could not be built over duplicate rows. Returns the dropped names.
+    """
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    dropped = []
+
+    for table_name, replaced in REPLACED_INDEXES.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table_name)}
+        for old, new in replaced.items():
+            if old in existing and new in existing:
+                with db.engine.begin() as connection:
+                    connection.execute(text(f"DROP INDEX {preparer.quote(old)}"))
+                dropped.append(old)
+    return dropped
+
+def backfill_ledger():
+    """Rebuild the inventory ledger from Booking when it is empty but bookings hold rooms.
+
+    A freshly created room_inventory table knows nothing about existing
+    bookings, and reservations against it would oversell their nights. This
+    also runs when the app is imported, so several workers may try at once:
+    on Postgres they queue on an advisory lock and re-check, elsewhere the
+    loser hits the ledger's primary key and leaves the winner's rows in place.
+    Returns the number of room-nights recorded, or None when nothing was done.
+    """
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': LEDGER_BACKFILL_LOCK})
+        if db.session.query(RoomInventory.room_id).first() is not None:
+            db.session.commit()
+            return None
+        if db.session.query(Booking.id).filter(Booking.status.in_(LEDGER_COLUMNS.keys())).first() is None:
+            db.session.commit()
+            return None
+        nights = rebuild_ledger()
+        db.session.commit()
+        return nights
+    except IntegrityError:
+        db.session.rollback()
+        app.logger.info("Inventory ledger was backfilled by another process")
+        return None
+
+def migrate():
+    with app.app_context():
+        db.create_all()
+        for column in add_missing_columns():
+            print(f"Added column {column}")
+        created, failed = add_missing_indexes()
+        for index in created:
+            print(f"Created index {index}")
+        for index in failed:
+            print(f"Could not create index {index}, see the log for details")
+        for index in drop_replaced_indexes():
+            print(f"Dropped index {index}")
+        nights = backfill_ledger()
+        if nights is not None:
+            print(f"Inventory ledger backfilled: {nights} room-nights recorded.")
+        print("Database schema is up to date!")
+
+if __name__ == "__main__":
+    migrate()
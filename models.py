@@ -1,5 +1,10 @@
+import hashlib
 import os
-from app import db
+from app import app, db
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from cache import bookings_changed, make_cache
+from metrics import record_booking_events
 from datetime import datetime, timedelta
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -20,6 +25,62 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def get_id(self):
+        return f"{self.id}:{password_fingerprint(self.password_hash)}"
+
+def password_fingerprint(password_hash):
+    """Short digest of a password hash, stored in the session to end it on a password change"""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+class CachedUser(UserMixin):
+    """Identity snapshot of a User served to current_user from the user cache.
+
+    Only carries the fields requests need, so it is safe to share across
+    requests without a database session.
+    """
+
+    def __init__(self, id, email, name, is_admin, fingerprint):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.is_admin = is_admin
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.email, user.name, bool(user.is_admin), password_fingerprint(user.password_hash))
+
+    def get_id(self):
+        return f"{self.id}:{self.fingerprint}"
+
+# CachedUser snapshots keyed by user id, in Redis when USER_CACHE_URL is set.
+# The per-process fallback only drops entries in the process that made the
+# change; admin_required re-reads is_admin from the database regardless.
+user_cache = make_cache(
+    ttl=app.config['USER_CACHE_TTL'],
+    maxsize=10000,
+    url=app.config['USER_CACHE_URL'],
+    prefix='ssparadise:user:'
+)
+
+@event.listens_for(User, 'after_update')
+def user_updated(mapper, connection, user):
+    state = db.inspect(user)
+    if any(state.attrs[field].history.has_changes() for field in ('is_admin', 'password_hash', 'email', 'name')):
+        user_cache.delete(user.id)
+    if state.attrs.name.history.has_changes():
+        # Reviews show the reviewer's name, so their rooms' pages change too
+        room = Room.__table__
+        connection.execute(
+            update(room)
+            .where(room.c.id.in_(select(Review.room_id).where(Review.user_id == user.id)))
+            .values(version=room.c.version + 1)
+        )
+
+@event.listens_for(User, 'after_delete')
+def user_deleted(mapper, connection, user):
+    user_cache.delete(user.id)
+
 class Room(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -29,18 +90,41 @@ class Room(db.Model):
     room_type = db.Column(db.String(50), nullable=False)
     amenities = db.Column(db.JSON)
     image_url = db.Column(db.String(200))
+    # Locally stored photo (room_images.py): size of the largest variant and
+    # the variant files by mimetype, as [[width, path], ...]
+    image_width = db.Column(db.Integer)
+    image_height = db.Column(db.Integer)
+    image_variants = db.Column(db.JSON(none_as_null=True))
     available = db.Column(db.Boolean, default=True)
     total_rooms = db.Column(db.Integer, default=1)  # Added total_rooms field
+    # Denormalized review aggregates, kept current by the Review mapper events below
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Change counters behind the HTTP validators (see http_cache.py): version
+    # moves on every edit or review, inventory_version on every ledger change
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    inventory_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     bookings = db.relationship('Booking', backref='room', lazy=True)
     reviews = db.relationship('Review', backref='room', lazy=True)
+    inventory = db.relationship('RoomInventory', backref='room', lazy=True, cascade='all, delete-orphan')
 
     @property
     def average_rating(self):
-        if not self.reviews:
+        if not self.rating_count:
             return 0
-        return sum(review.rating for review in self.reviews) / len(self.reviews)
+        return self.rating_sum / self.rating_count
 
 class Booking(db.Model):
+    __table_args__ = (
+        db.Index('ix_booking_room_status_dates', 'room_id', 'status', 'check_in', 'check_out'),
+        db.Index('ix_booking_user_created', 'user_id', 'created_at'),
+        db.Index('ix_booking_created', 'created_at', 'id'),
+        db.Index('ix_booking_status_created', 'status', 'created_at'),
+        db.Index('ix_booking_status_hold_expires', 'status', 'hold_expires_at'),
+        db.Index('ix_booking_user_room_status', 'user_id', 'room_id', 'status', 'check_out'),
+        db.Index('ux_booking_payment_intent', 'payment_intent_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -52,6 +136,7 @@ class Booking(db.Model):
     room_quantity = db.Column(db.Integer, default=1)  # Added room_quantity field
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='pending')
+    hold_expires_at = db.Column(db.DateTime)  # When an unpaid pending booking releases its rooms
     # Payment-related fields
     payment_status = db.Column(db.String(20), default='pending')
     payment_option = db.Column(db.String(20), default='now')  # 'now' or 'later'
@@ -66,7 +151,7 @@ class Booking(db.Model):
 
     @property
     def can_cancel(self):
-        if self.status == 'cancelled':
+        if self.status in ('cancelled', 'expired'):
             return False
         if self.check_in <= datetime.now().date():
             return False
@@ -97,6 +182,54 @@ class Booking(db.Model):
             return 0
         return self.amount_paid - self.cancellation_fee
 
+class RoomInventory(db.Model):
+    """Per-night inventory ledger for a room type.
+
+    held counts rooms reserved by pending bookings, booked counts rooms taken
+    by confirmed bookings. Rows are maintained by availability.py in the same
+    transaction as the booking change.
+    """
+    __tablename__ = 'room_inventory'
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), primary_key=True)
+    night = db.Column(db.Date, primary_key=True)
+    held = db.Column(db.Integer, nullable=False, default=0)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+
+class EmailOutbox(db.Model):
+    """Outgoing email queued by the request path and delivered by worker.py."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    booking_id = db.Column(db.Integer)
+    subject = db.Column(db.String(200), nullable=False)
+    recipients = db.Column(db.JSON, nullable=False)
+    cc = db.Column(db.JSON)
+    body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+class StripeEvent(db.Model):
+    """Raw Stripe webhook event, stored once per event id and applied by worker.py."""
+    __tablename__ = 'stripe_event'
+    __table_args__ = (
+        db.Index('ix_stripe_event_processed_received', 'processed_at', 'received_at'),
+    )
+
+    id = db.Column(db.String(255), primary_key=True)  # Stripe event id
+    type = db.Column(db.String(100), nullable=False)
+    payment_intent_id = db.Column(db.String(100), index=True)
+    payload = db.Column(db.JSON, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -105,9 +238,100 @@ class Contact(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Review(db.Model):
+    __table_args__ = (
+        db.Index('ix_review_room_created', 'room_id', 'created_at', 'id'),
+        # One review per user and room; submit_review relies on it under concurrent posts
+        db.Index('ux_review_user_room', 'user_id', 'room_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def _adjust_room_rating(connection, room_id, rating_delta, count_delta):
+    room = Room.__table__
+    connection.execute(
+        update(room)
+        .where(room.c.id == room_id)
+        .values(
+            rating_sum=room.c.rating_sum + rating_delta,
+            rating_count=room.c.rating_count + count_delta,
+            version=room.c.version + 1
+        )
+    )
+
+@event.listens_for(Room, 'before_update')
+def room_updated(mapper, connection, room):
+    if db.object_session(room).is_modified(room, include_collections=False):
+        room.version = Room.version + 1
+
+@event.listens_for(Review, 'after_insert')
+def review_inserted(mapper, connection, review):
+    _adjust_room_rating(connection, review.room_id, review.rating, 1)
+
+@event.listens_for(Review, 'after_delete')
+def review_deleted(mapper, connection, review):
+    _adjust_room_rating(connection, review.room_id, -review.rating, -1)
+
+@event.listens_for(Review, 'after_update')
+def review_updated(mapper, connection, review):
+    state = db.inspect(review)
+    room_history = state.attrs.room_id.history
+    rating_history = state.attrs.rating.history
+    if not room_history.has_changes() and not rating_history.has_changes():
+        return
+    old_room_id = room_history.deleted[0] if room_history.deleted else review.room_id
+    old_rating = rating_history.deleted[0] if rating_history.deleted else review.rating
+    _adjust_room_rating(connection, old_room_id, -old_rating, -1)
+    _adjust_room_rating(connection, review.room_id, review.rating, 1)
+
+def reconcile_room_ratings():
+    """Recompute every room's rating aggregates from the Review table. Does not commit."""
+    room = Room.__table__
+    review = Review.__table__
+    return db.session.execute(
+        update(room).values(
+            rating_sum=select(func.coalesce(func.sum(review.c.rating), 0))
+                .where(review.c.room_id == room.c.id).scalar_subquery(),
+            rating_count=select(func.count(review.c.id))
+                .where(review.c.room_id == room.c.id).scalar_subquery(),
+            version=room.c.version + 1
+        )
+    ).rowcount
+
+def changed_to(booking, attribute, value):
+    history = db.inspect(booking).attrs[attribute].history
+    return history.has_changes() and value in history.added
+
+@event.listens_for(Session, 'after_flush')
+def track_booking_changes(session, flush_context):
+    if any(isinstance(obj, Booking) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['bookings_changed'] = True
+
+    # Lifecycle events are counted for metrics once the transaction commits
+    events = session.info.setdefault('booking_events', {})
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            events['created'] = events.get('created', 0) + 1
+    for obj in session.dirty:
+        if isinstance(obj, Booking):
+            if changed_to(obj, 'status', 'cancelled'):
+                events['cancelled'] = events.get('cancelled', 0) + 1
+            if changed_to(obj, 'refund_status', 'completed'):
+                events['refunded'] = events.get('refunded', 0) + 1
+
+@event.listens_for(Session, 'after_commit')
+def notify_booking_changes(session):
+    if session.info.pop('bookings_changed', False):
+        bookings_changed()
+    events = session.info.pop('booking_events', None)
+    if events:
+        record_booking_events(events)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_booking_changes(session):
+    session.info.pop('bookings_changed', None)
+    session.info.pop('booking_events', None)
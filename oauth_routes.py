@@ -1,15 +1,53 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import redirect, request, url_for, flash, current_app
 from flask_login import login_user
+from werkzeug.datastructures import ResponseCacheControl
+from werkzeug.http import parse_cache_control_header
 from app import app, db
+from cache import TTLCache
 from models import User
 from oauth_config import client, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_DISCOVERY_URL
 from urllib.parse import urlencode, urljoin
 
+# (connect, read) timeouts in seconds for every call to Google
+OAUTH_TIMEOUT = (3.05, 10)
+# Discovery document lifetime when Google sends no max-age
+DEFAULT_DISCOVERY_TTL = 3600
+
+# One pooled session for all OAuth calls so TLS connections to Google are reused
+oauth_http = requests.Session()
+oauth_http.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.2, allowed_methods=['GET'], status_forcelist=[502, 503, 504])
+))
+
+provider_cfg_cache = TTLCache(ttl=DEFAULT_DISCOVERY_TTL, maxsize=4)
+
+def discovery_ttl(cache_control_header):
+    """Seconds a response may be cached for according to its Cache-Control header"""
+    cache_control = parse_cache_control_header(cache_control_header, cls=ResponseCacheControl)
+    if cache_control.no_store or cache_control.no_cache:
+        return 0
+    if cache_control.max_age is not None:
+        return cache_control.max_age
+    return DEFAULT_DISCOVERY_TTL
+
 def get_google_provider_cfg():
+    provider_cfg = provider_cfg_cache.get(GOOGLE_DISCOVERY_URL)
+    if provider_cfg is not None:
+        return provider_cfg
     try:
-        return requests.get(GOOGLE_DISCOVERY_URL).json()
+        response = oauth_http.get(GOOGLE_DISCOVERY_URL, timeout=OAUTH_TIMEOUT)
+        response.raise_for_status()
+        provider_cfg = response.json()
+        ttl = discovery_ttl(response.headers.get('Cache-Control'))
+        if ttl > 0:
+            provider_cfg_cache.set(GOOGLE_DISCOVERY_URL, provider_cfg, ttl)
+        return provider_cfg
     except Exception as e:
         app.logger.error(f"Error fetching Google provider config: {str(e)}")
         return None
@@ -72,11 +110,12 @@ def google_callback():
             code=code
         )
 
-        token_response = requests.post(
+        token_response = oauth_http.post(
             token_url,
             headers=headers,
             data=body,
             auth=(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET),
+            timeout=OAUTH_TIMEOUT
         )
 
         # Parse the tokens
@@ -85,12 +124,12 @@ def google_callback():
         # Get user info from Google
         userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
         uri, headers, body = client.add_token(userinfo_endpoint)
-        userinfo_response = requests.get(uri, headers=headers)
+        userinfo = oauth_http.get(uri, headers=headers, timeout=OAUTH_TIMEOUT).json()
 
-        if userinfo_response.json().get("email_verified"):
-            google_id = userinfo_response.json()["sub"]
-            email = userinfo_response.json()["email"]
-            name = userinfo_response.json().get("name", email.split('@')[0])
+        if userinfo.get("email_verified"):
+            google_id = userinfo["sub"]
+            email = userinfo["email"]
+            name = userinfo.get("name", email.split('@')[0])
 
             # Check if user exists
             user = User.query.filter_by(email=email).first()
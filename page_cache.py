@@ -0,0 +1,106 @@
+import os
+import uuid
+from datetime import date
+from functools import wraps
+from flask import Response, g, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from cache import make_cache, on_bookings_changed
+
+# Version tokens outlive the pages keyed by them; a lost token only costs misses
+VERSION_TTL = 30 * 24 * 3600
+
+_cache = None
+
+def init_page_cache(app, client=None):
+    """Set up the page and fragment cache.
+
+    Uses an in-process LRU by default, or Redis shared by every worker when
+    PAGE_CACHE_URL is set. A redis-compatible client can be passed instead,
+    which is how a local stand-in replaces the server.
+    """
+    global _cache
+    # Seconds a rendered page or fragment is kept. With the in-process cache
+    # this also bounds how long other workers serve a page after a change.
+    app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 60))
+    app.config['PAGE_CACHE_URL'] = os.environ.get('PAGE_CACHE_URL')
+    _cache = make_cache(
+        ttl=app.config['PAGE_CACHE_TTL'],
+        maxsize=2000,
+        url=app.config['PAGE_CACHE_URL'],
+        client=client,
+        prefix='ssparadise:page:'
+    )
+
+def _version(name):
+    token = _cache.get(f"version:{name}")
+    if token is None:
+        token = uuid.uuid4().hex[:12]
+        _cache.set(f"version:{name}", token, VERSION_TTL)
+    return token
+
+def _bump(name):
+    _cache.set(f"version:{name}", uuid.uuid4().hex[:12], VERSION_TTL)
+
+# Keys embed version tokens: the room listing (names, prices, ratings of all
+# rooms), tonight's availability, and each room's own version. Bumping a
+# token retires every page built from it.
+
+def listing_key(name):
+    return f"{name}:{_version('listing')}"
+
+def availability_key(name):
+    return f"{name}:{date.today().isoformat()}:{_version('listing')}:{_version('availability')}"
+
+def room_key(name, room_id):
+    return f"{name}:{room_id}:{_version(f'room:{room_id}')}"
+
+def invalidate_room(room_id):
+    """A room was added, edited, deleted or reviewed"""
+    _bump(f"room:{room_id}")
+    _bump('listing')
+
+@on_bookings_changed
+def invalidate_availability():
+    _bump('availability')
+
+def _fingerprinted(key):
+    # Under conditional_get the key also carries the database fingerprint the
+    # ETag is built from. Version tokens are per process with the in-process
+    # cache, so without it a worker that missed another's bump would serve
+    # its old page under the new ETag.
+    fingerprint = g.get('cache_fingerprint')
+    return f"{key}:{fingerprint}" if fingerprint else key
+
+def cached_fragment(key, render):
+    """Return rendered HTML for key, calling render() on a miss"""
+    return Markup(_cache.get_or_set(f"fragment:{_fingerprinted(key)}", render))
+
+def cached_page(key_func):
+    """Serve anonymous GETs of a view from the page cache.
+
+    key_func takes the view's arguments and returns the page key; the query
+    string is appended. Logged-in users and responses with pending flash
+    messages always get a fresh render.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method != 'GET' or current_user.is_authenticated or session.get('_flashes'):
+                return view(**kwargs)
+
+            key = f"page:{_fingerprinted(key_func(**kwargs))}?{request.query_string.decode()}"
+            cached = _cache.get(key)
+            if cached is not None:
+                body, mimetype = cached
+                response = Response(body, mimetype=mimetype)
+                response.headers['X-Page-Cache'] = 'HIT'
+                return response
+
+            response = make_response(view(**kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                _cache.set(key, (response.get_data(), response.mimetype))
+                response.headers['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
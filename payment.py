@@ -1,10 +1,31 @@
 import os
 import stripe
 from datetime import datetime
+from sqlalchemy import update
 from app import app, db
-from models import Booking
+from cache import bookings_changed
+from metrics import external_call
+from models import Booking, StripeEvent
+from availability import RoomUnavailable, confirm_pending_booking, set_booking_status
 
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+# Point the client at stripe-mock or a local stub
+stripe.api_base = os.environ.get('STRIPE_API_BASE', stripe.api_base)
+
+# Webhook event types applied to bookings; others are acknowledged and dropped
+HANDLED_EVENT_TYPES = ('payment_intent.succeeded', 'charge.refunded')
+
+# Booking.payment_status for a Stripe PaymentIntent status; anything else is still pending
+PAYMENT_STATUS_FROM_STRIPE = {
+    'succeeded': 'completed',
+    'canceled': 'failed',
+}
+
+def event_payment_intent_id(event_object):
+    """PaymentIntent id a handled event's data object refers to"""
+    if event_object.get('object') == 'payment_intent':
+        return event_object.get('id')
+    return event_object.get('payment_intent')
 
 def calculate_booking_amount(check_in, check_out, room_price):
     """Calculate the total amount for the booking."""
@@ -21,14 +42,15 @@ def create_payment_intent(booking_id):
     amount_cents = int(amount * 100)  # Convert to cents for Stripe
     
     try:
-        intent = stripe.PaymentIntent.create(
-            amount=amount_cents,
-            currency='inr',
-            metadata={
-                'booking_id': booking_id,
-                'guest_email': booking.guest_email
-            }
-        )
+        with external_call('stripe', 'PaymentIntent.create'):
+            intent = stripe.PaymentIntent.create(
+                amount=amount_cents,
+                currency='inr',
+                metadata={
+                    'booking_id': booking_id,
+                    'guest_email': booking.guest_email
+                }
+            )
         
         # Update booking with payment intent ID
         booking.payment_intent_id = intent.id
@@ -42,26 +64,130 @@ def create_payment_intent(booking_id):
         raise
 
 def confirm_payment(payment_intent_id):
-    """Confirm a successful payment and update booking status."""
-    try:
-        payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-        booking = Booking.query.filter_by(payment_intent_id=payment_intent_id).first()
-        
-        if not booking:
-            raise ValueError("Booking not found")
-            
-        if payment_intent.status == 'succeeded':
-            booking.payment_status = 'completed'
-            booking.status = 'confirmed'
-            booking.payment_date = datetime.utcnow()
+    """Report whether a booking's payment has completed.
+
+    Payment state arrives through the Stripe webhook, so this reads the local
+    booking instead of calling Stripe. A succeeded event that is stored but not
+    yet applied by the worker is applied here first.
+    """
+    booking = Booking.query.filter_by(payment_intent_id=payment_intent_id).first()
+    if not booking:
+        raise ValueError("Booking not found")
+
+    if booking.payment_status != 'completed':
+        pending_events = StripeEvent.query.filter(
+            StripeEvent.payment_intent_id == payment_intent_id,
+            StripeEvent.processed_at.is_(None)
+        ).all()
+        if pending_events:
+            apply_stripe_events(pending_events)
             db.session.commit()
-            return True
-            
+
+    return booking.payment_status == 'completed'
+
+def apply_stripe_events(events):
+    """Apply a batch of stored Stripe events to their bookings. Does not commit.
+
+    Bookings for the whole batch are loaded with one query keyed by
+    payment_intent_id, then every event is marked processed.
+    """
+    succeeded = {}
+    refunded = {}
+    for event in events:
+        obj = event.payload['data']['object']
+        if event.type == 'payment_intent.succeeded':
+            succeeded[obj['id']] = obj
+        elif event.type == 'charge.refunded' and obj.get('payment_intent'):
+            refunded[obj['payment_intent']] = obj
+
+    intent_ids = set(succeeded) | set(refunded)
+    bookings = Booking.query.filter(Booking.payment_intent_id.in_(intent_ids)).all() if intent_ids else []
+
+    for booking in bookings:
+        intent = succeeded.get(booking.payment_intent_id)
+        if intent and booking.payment_status != 'completed':
+            booking.payment_status = 'completed'
+            booking.amount_paid = intent.get('amount_received', intent.get('amount', 0)) / 100
+            booking.payment_date = datetime.utcfromtimestamp(intent['created']) if intent.get('created') else datetime.utcnow()
+            if not confirm_pending_booking(booking) and not confirm_late_payment(booking):
+                app.logger.warning(f"Payment succeeded for {booking.status} booking {booking.id}")
+
+        charge = refunded.get(booking.payment_intent_id)
+        if charge:
+            booking.refund_status = 'completed'
+            booking.refund_amount = charge.get('amount_refunded', 0) / 100
+
+    processed_at = datetime.utcnow()
+    for event in events:
+        event.processed_at = processed_at
+    return len(bookings)
+
+def confirm_late_payment(booking):
+    """Confirm an expired booking whose payment succeeded after its hold lapsed.
+
+    The rooms are taken again if they are still free. Otherwise the payment is
+    refunded in full, so the guest is not charged for a room they did not get.
+    Returns True if the booking was handled. Does not commit.
+    """
+    if booking.status != 'expired':
         return False
-        
+    try:
+        # A savepoint, so a full room only undoes this booking and not the batch
+        with db.session.begin_nested():
+            if not set_booking_status(booking, 'confirmed', 'expired'):
+                return False
+            booking.cancelled_at = None
+            booking.cancellation_reason = None
+        return True
+    except RoomUnavailable:
+        pass
+
+    booking.cancellation_reason = 'Payment arrived after the hold expired and no room was left'
+    try:
+        with external_call('stripe', 'Refund.create'):
+            stripe.Refund.create(
+                payment_intent=booking.payment_intent_id,
+                metadata={'booking_id': booking.id, 'refund_reason': booking.cancellation_reason},
+                idempotency_key=f"late-payment-refund-{booking.id}"
+            )
+        booking.refund_status = 'completed'
+        booking.refund_amount = booking.amount_paid
     except stripe.error.StripeError as e:
-        app.logger.error(f"Stripe error: {str(e)}")
-        raise
+        # Left for an admin: the booking shows a paid, expired stay with a failed refund
+        app.logger.error(f"Could not refund late payment for booking {booking.id}: {str(e)}")
+        booking.refund_status = 'failed'
+    return True
+
+def process_stripe_events(batch_size=100):
+    """Apply the oldest unprocessed Stripe events in one batch and commit.
+
+    Returns the number of events processed. Events are claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED on Postgres so several workers can run.
+    """
+    events = StripeEvent.query.filter(
+        StripeEvent.processed_at.is_(None)
+    ).order_by(StripeEvent.received_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if events:
+        apply_stripe_events(events)
+    db.session.commit()
+    return len(events)
+
+def cancel_payment_intents(payment_intent_ids):
+    """Cancel the PaymentIntents of expired holds so they can no longer be paid.
+
+    Returns the number cancelled. An intent that already succeeded or was
+    cancelled cannot be cancelled; that is logged and left to the webhook.
+    """
+    cancelled = 0
+    for payment_intent_id in payment_intent_ids:
+        try:
+            with external_call('stripe', 'PaymentIntent.cancel'):
+                stripe.PaymentIntent.cancel(payment_intent_id, cancellation_reason='abandoned')
+            cancelled += 1
+        except stripe.error.StripeError as e:
+            app.logger.warning(f"Could not cancel payment intent {payment_intent_id}: {str(e)}")
+    return cancelled
 
 def process_refund(booking_id):
     """Process refund for a cancelled booking."""
@@ -80,14 +206,15 @@ def process_refund(booking_id):
     
     try:
         refund_amount_cents = int(refund_amount * 100)
-        refund = stripe.Refund.create(
-            payment_intent=booking.payment_intent_id,
-            amount=refund_amount_cents,
-            metadata={
-                'booking_id': booking_id,
-                'refund_reason': booking.cancellation_reason
-            }
-        )
+        with external_call('stripe', 'Refund.create'):
+            refund = stripe.Refund.create(
+                payment_intent=booking.payment_intent_id,
+                amount=refund_amount_cents,
+                metadata={
+                    'booking_id': booking_id,
+                    'refund_reason': booking.cancellation_reason
+                }
+            )
         
         booking.refund_status = 'completed'
         booking.refund_amount = refund_amount
@@ -100,3 +227,118 @@ def process_refund(booking_id):
         booking.refund_status = 'failed'
         db.session.commit()
         raise
+
+def _list_all(resource, operation, params):
+    """Yield every object of a Stripe list, timing each page request separately"""
+    with external_call('stripe', operation):
+        page = resource.list(**params)
+    while True:
+        yield from page.data
+        if not page.has_more:
+            return
+        with external_call('stripe', operation):
+            page = page.next_page()
+
+def list_stripe_payments(created_since=None):
+    """Return {payment_intent_id: (payment_status, amount_paid)} for every PaymentIntent in Stripe."""
+    params = {'limit': 100}
+    if created_since:
+        params['created'] = {'gte': int(created_since.timestamp())}
+
+    payments = {}
+    for intent in _list_all(stripe.PaymentIntent, 'PaymentIntent.list', params):
+        payments[intent.id] = (
+            PAYMENT_STATUS_FROM_STRIPE.get(intent.status, 'pending'),
+            (intent.amount_received or 0) / 100
+        )
+    return payments
+
+def list_stripe_refunds(created_since=None):
+    """Return {payment_intent_id: refunded amount} summed over succeeded Stripe refunds."""
+    params = {'limit': 100}
+    if created_since:
+        params['created'] = {'gte': int(created_since.timestamp())}
+
+    refunds = {}
+    for refund in _list_all(stripe.Refund, 'Refund.list', params):
+        if refund.status == 'succeeded' and refund.payment_intent:
+            refunds[refund.payment_intent] = refunds.get(refund.payment_intent, 0) + refund.amount / 100
+    return refunds
+
+def booking_corrections(booking, payment, refunded):
+    """Return the column values that bring one booking row in line with Stripe."""
+    changes = {}
+    payment_status, amount_paid = payment
+    if booking.payment_status != payment_status:
+        changes['payment_status'] = payment_status
+    if payment_status == 'completed':
+        if booking.amount_paid != amount_paid:
+            changes['amount_paid'] = amount_paid
+        if not booking.payment_date:
+            changes['payment_date'] = datetime.utcnow()
+
+    if refunded:
+        if booking.refund_status != 'completed' or booking.refund_amount != refunded:
+            changes['refund_status'] = 'completed'
+            changes['refund_amount'] = refunded
+    elif booking.refund_status == 'completed':
+        # Recorded locally but Stripe never refunded it
+        changes['refund_status'] = 'failed'
+    return changes
+
+def reconcile_payments(created_since=None, batch_size=1000):
+    """Correct Booking payment and refund fields that have drifted from Stripe.
+
+    Stripe PaymentIntents and Refunds are paged into compact in-memory maps,
+    then bookings are streamed with yield_per and corrections are written in
+    batched UPDATEs keyed by primary key. Pending bookings whose payment
+    succeeded are confirmed through the inventory ledger. Returns a dict of
+    counts; bookings whose PaymentIntent Stripe does not know are only counted.
+    """
+    payments = list_stripe_payments(created_since)
+    refunds = list_stripe_refunds(created_since)
+    stats = {'checked': 0, 'corrected': 0, 'confirmed': 0, 'missing': 0}
+
+    bookings = db.session.query(
+        Booking.id, Booking.payment_intent_id, Booking.status, Booking.payment_status,
+        Booking.amount_paid, Booking.payment_date, Booking.refund_status, Booking.refund_amount
+    ).filter(Booking.payment_intent_id.isnot(None)).order_by(Booking.id)
+    if created_since:
+        bookings = bookings.filter(Booking.created_at >= created_since)
+
+    corrections = []
+    to_confirm = []
+    for booking in bookings.yield_per(batch_size):
+        stats['checked'] += 1
+        payment = payments.get(booking.payment_intent_id)
+        if payment is None:
+            stats['missing'] += 1
+            continue
+
+        changes = booking_corrections(booking, payment, refunds.get(booking.payment_intent_id, 0))
+        if changes:
+            corrections.append({'id': booking.id, **changes})
+        if payment[0] == 'completed' and booking.status == 'pending':
+            to_confirm.append(booking.id)
+
+        if len(corrections) >= batch_size:
+            db.session.execute(update(Booking), corrections)
+            stats['corrected'] += len(corrections)
+            corrections = []
+
+    if corrections:
+        db.session.execute(update(Booking), corrections)
+        stats['corrected'] += len(corrections)
+
+    for start in range(0, len(to_confirm), batch_size):
+        for booking in Booking.query.filter(Booking.id.in_(to_confirm[start:start + batch_size])).all():
+            if confirm_pending_booking(booking):
+                stats['confirmed'] += 1
+
+    db.session.commit()
+    if stats['corrected']:
+        # Bulk UPDATEs bypass the session's booking change tracking
+        bookings_changed()
+    if stats['missing']:
+        app.logger.warning(f"{stats['missing']} bookings reference PaymentIntents unknown to Stripe")
+    return stats
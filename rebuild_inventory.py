@@ -0,0 +1,12 @@
+from app import app, db
+from availability import rebuild_ledger
+
+def rebuild_inventory():
+    with app.app_context():
+        db.create_all()
+        nights = rebuild_ledger()
+        db.session.commit()
+        print(f"Inventory ledger rebuilt: {nights} room-nights recorded.")
+
+if __name__ == "__main__":
+    rebuild_inventory()
@@ -0,0 +1,14 @@
+import sys
+from datetime import datetime, timedelta
+from app import app
+from payment import reconcile_payments
+
+def reconcile(days=None):
+    with app.app_context():
+        created_since = datetime.utcnow() - timedelta(days=days) if days else None
+        stats = reconcile_payments(created_since)
+        print(f"Checked {stats['checked']} bookings: {stats['corrected']} corrected, "
+              f"{stats['confirmed']} confirmed, {stats['missing']} unknown to Stripe.")
+
+if __name__ == "__main__":
+    reconcile(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,11 @@
+from app import app, db
+from models import reconcile_room_ratings
+
+def reconcile_ratings():
+    with app.app_context():
+        rooms = reconcile_room_ratings()
+        db.session.commit()
+        print(f"Rating aggregates recomputed for {rooms} rooms.")
+
+if __name__ == "__main__":
+    reconcile_ratings()
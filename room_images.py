@@ -0,0 +1,113 @@
+import io
+import os
+import requests
+from flask import abort, current_app, send_from_directory, url_for
+from PIL import Image
+from assets import IMAGE_SETTINGS, content_hash, responsive_image, write_image_variants
+from metrics import external_call
+
+# Card thumbnails (320/640) and detail-page sizes (960/1600), made once per image
+ROOM_IMAGE_WIDTHS = (320, 640, 960, 1600)
+ROOM_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+class InvalidImage(Exception):
+    """An upload or image URL did not yield a usable photo"""
+
+def init_room_images(app):
+    """Serve stored room photos from /media/ and expose room_image() to templates"""
+    app.config['MEDIA_DIR'] = os.environ.get('MEDIA_DIR')
+    if not app.config['MEDIA_DIR']:
+        if os.environ.get('RENDER') or os.environ.get('DYNO'):
+            # The instance folder is rebuilt on every deploy there, taking stored photos with it
+            app.logger.error("MEDIA_DIR environment variable is not set; room photo uploads are disabled until it points at a persistent disk")
+        else:
+            app.config['MEDIA_DIR'] = os.path.join(app.instance_path, 'media')
+    app.config['MAX_IMAGE_BYTES'] = int(os.environ.get('MAX_IMAGE_BYTES', 15 * 1024 * 1024))
+    app.config['IMAGE_FETCH_TIMEOUT'] = float(os.environ.get('IMAGE_FETCH_TIMEOUT', 15))
+    app.jinja_env.globals['room_image'] = room_image
+
+    @app.route('/media/<path:filename>')
+    def media(filename):
+        if not app.config['MEDIA_DIR']:
+            abort(404)
+        # Stored files are named by content hash and never change
+        response = send_from_directory(app.config['MEDIA_DIR'], filename, max_age=app.config['ASSET_MAX_AGE'])
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+def store_room_image(room, data):
+    """Generate a room's photo variants from image bytes and record them on the room.
+
+    Does not commit. Raises InvalidImage for oversized or unreadable files,
+    or when MEDIA_DIR is not configured.
+    """
+    _require_storage()
+    if len(data) > current_app.config['MAX_IMAGE_BYTES']:
+        raise InvalidImage(f"images must be under {current_app.config['MAX_IMAGE_BYTES'] // (1024 * 1024)} MB")
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise InvalidImage("not a readable JPEG, PNG or WebP image")
+    if image.format not in ROOM_IMAGE_FORMATS:
+        raise InvalidImage(f"unsupported image format {image.format}")
+
+    name = f"rooms/{content_hash(data, f'{ROOM_IMAGE_WIDTHS}:{IMAGE_SETTINGS}')}"
+    entry = write_image_variants(image, name, current_app.config['MEDIA_DIR'], ROOM_IMAGE_WIDTHS)
+    room.image_width = entry['width']
+    room.image_height = entry['height']
+    room.image_variants = entry['sources']
+
+def fetch_image(url):
+    """Download an image, reading no more than MAX_IMAGE_BYTES + 1 bytes"""
+    try:
+        with external_call('images', 'fetch'):
+            with requests.get(url, timeout=current_app.config['IMAGE_FETCH_TIMEOUT'], stream=True) as response:
+                response.raise_for_status()
+                return response.raw.read(current_app.config['MAX_IMAGE_BYTES'] + 1, decode_content=True)
+    except requests.RequestException as e:
+        raise InvalidImage(f"could not download {url} ({e})")
+
+def ingest_image_url(room, url):
+    """Download a remote image once and store it locally for the room. Does not commit."""
+    # Checked before the download, which can take up to IMAGE_FETCH_TIMEOUT
+    _require_storage()
+    store_room_image(room, fetch_image(url))
+    room.image_url = url
+
+def storage_configured():
+    """True when MEDIA_DIR is set, so room photos can be stored locally"""
+    return bool(current_app.config['MEDIA_DIR'])
+
+def clear_room_image(room):
+    """Remove a room's photo, remote or stored. Does not commit."""
+    room.image_url = None
+    room.image_width = None
+    room.image_height = None
+    room.image_variants = None
+
+def _require_storage():
+    if not storage_configured():
+        raise InvalidImage("photo storage is not configured (set MEDIA_DIR to a persistent disk)")
+
+def stored_image_url(room):
+    """Absolute URL of the largest JPEG or PNG variant of a room's stored photo"""
+    return url_for('media', filename=_fallback_variant(room), _external=True)
+
+def _fallback_variant(room):
+    return next(variants for mimetype, variants in room.image_variants.items() if mimetype != 'image/webp')[-1][1]
+
+def room_image(room):
+    """Responsive variants of a room's stored photo.
+
+    None when the room only has image_url, or when its stored files are gone
+    (e.g. MEDIA_DIR was lost), so templates fall back to image_url.
+    """
+    if not room.image_variants or not current_app.config['MEDIA_DIR']:
+        return None
+    if not os.path.exists(os.path.join(current_app.config['MEDIA_DIR'], _fallback_variant(room))):
+        return None
+    return responsive_image(
+        {'width': room.image_width, 'height': room.image_height, 'sources': room.image_variants}, 'media'
+    )
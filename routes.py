@@ -1,20 +1,53 @@
 from flask import render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_user, logout_user, login_required, current_user
-from app import app, db, get_db
-from models import Room, Booking, Contact, User, Review
-from datetime import datetime
+from app import app, db
+from models import Room, Booking, Contact, User, Review, RoomInventory
+from datetime import datetime, timedelta
 from email_validator import validate_email, EmailNotValidError
 from payment import create_payment_intent, confirm_payment, process_refund
 from utils import admin_required
-from email_utils import send_booking_confirmation, send_booking_status_update
+from instrumentation import endpoint_stats
+from page_cache import cached_page, cached_fragment, invalidate_room, availability_key, room_key
+from http_cache import conditional_get
+from room_images import store_room_image, stored_image_url, ingest_image_url, clear_room_image, storage_configured, InvalidImage
+from cache import TTLCache, on_bookings_changed
+from availability import get_free_counts, get_calendar, reserve_booking, release_booking, set_booking_status, RoomUnavailable
+from email_utils import queue_booking_confirmation, queue_booking_status_update, queue_room_update_notices
 import stripe
-from sqlalchemy import func, and_, not_
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import func, select, and_, or_, not_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import IntegrityError, OperationalError
 
-@app.route('/api/check-room-availability', methods=['POST'])
+def rooms_fingerprint(room_ids=None):
+    """Cheap summary of the rooms' edit and ledger counters for ETags"""
+    query = db.session.query(
+        func.count(Room.id),
+        func.max(Room.id),
+        func.sum(Room.version),
+        func.sum(Room.inventory_version)
+    )
+    if room_ids is not None:
+        query = query.filter(Room.id.in_(room_ids))
+    return '-'.join(str(value) for value in query.one())
+
+def availability_fingerprint():
+    room_id = request.args.get('room_id', type=int)
+    return rooms_fingerprint([room_id] if room_id is not None else None)
+
+def room_detail_fingerprint(room_id):
+    versions = db.session.query(Room.version, Room.inventory_version).filter(Room.id == room_id).first()
+    if versions is None:
+        return None
+    if current_user.is_authenticated:
+        # The review form depends on the user's confirmed stays
+        return f"{versions.version}-{versions.inventory_version}"
+    return versions.version
+
+@app.route('/api/check-room-availability', methods=['GET', 'POST'])
+@conditional_get(availability_fingerprint, max_age=30, per_user=False)
 def check_room_availability():
     try:
-        data = request.get_json()
+        data = request.get_json() if request.method == 'POST' else request.args
         if not data or 'check_in' not in data or 'check_out' not in data:
             return jsonify({
                 'success': False,
@@ -30,28 +63,24 @@ def check_room_availability():
                 'error': 'Invalid date format. Please use YYYY-MM-DD format.'
             }), 400
 
-        session = get_db()
-        query = Room.query.filter_by(available=True)
-        
+        room_ids = None
         if 'room_id' in data:
-            query = query.filter(Room.id == data['room_id'])
+            try:
+                room_ids = [int(data['room_id'])]
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid room id'
+                }), 400
 
-        rooms = query.all()
+        free_counts = get_free_counts(check_in, check_out, room_ids=room_ids)
         available_rooms = []
         rooms_count = {}
 
-        for room in rooms:
-            booked_rooms = session.query(func.sum(Booking.room_quantity)).filter(
-                Booking.room_id == room.id,
-                Booking.status == 'confirmed',
-                Booking.check_in < check_out,
-                Booking.check_out > check_in
-            ).scalar() or 0
-
-            available = room.total_rooms - booked_rooms
+        for room_id, available in free_counts.items():
             if available > 0:
-                available_rooms.append(room.id)
-                rooms_count[room.id] = available
+                available_rooms.append(room_id)
+                rooms_count[room_id] = available
 
         return jsonify({
             'success': True,
@@ -71,25 +100,158 @@ def check_room_availability():
             'error': 'Error checking room availability'
         }), 500
 
+# Longest range the calendar API will return in one call
+MAX_CALENDAR_DAYS = 365
+
+@app.route('/api/room-calendar')
+@conditional_get(availability_fingerprint, max_age=60, per_user=False)
+def room_calendar():
+    """Free-room counts per night for one or all room types over a date range"""
+    try:
+        start = datetime.strptime(request.args.get('start', datetime.now().date().isoformat()), '%Y-%m-%d').date()
+        days = request.args.get('days', type=int)
+        if 'end' in request.args:
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+            days = (end - start).days
+        elif days is None:
+            days = 30
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid date format. Please use YYYY-MM-DD format.'
+        }), 400
+
+    if days < 1 or days > MAX_CALENDAR_DAYS:
+        return jsonify({
+            'success': False,
+            'error': f'Date range must be between 1 and {MAX_CALENDAR_DAYS} days'
+        }), 400
+
+    room_id = request.args.get('room_id', type=int)
+    room_ids = [room_id] if room_id is not None else None
+
+    try:
+        end = start + timedelta(days=days)
+        calendar = get_calendar(start, end, room_ids=room_ids)
+    except OperationalError:
+        return jsonify({
+            'success': False,
+            'error': 'Database connection error. Please try again.'
+        }), 503
+
+    return jsonify({
+        'success': True,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'rooms': calendar
+    })
+
+def render_room_listing():
+    tonight = datetime.now().date()
+    occupied = db.session.query(
+        RoomInventory.room_id.label('room_id'),
+        (RoomInventory.held + RoomInventory.booked).label('occupied')
+    ).filter(RoomInventory.night == tonight).subquery()
+
+    # One query returns each room with its plain listing values, so the
+    # template never lazy-loads bookings or reviews
+    listings = db.session.query(
+        Room,
+        (Room.total_rooms - func.coalesce(occupied.c.occupied, 0)).label('rooms_left')
+    ).outerjoin(occupied, occupied.c.room_id == Room.id
+    ).filter(Room.available == True).order_by(Room.id).all()
+
+    return render_template('_room_listing.html', listings=listings)
+
 @app.route('/rooms')
+@conditional_get(rooms_fingerprint)
+@cached_page(lambda: availability_key('rooms'))
 def rooms():
     """Display all available rooms with filtering capability"""
-    rooms = Room.query.filter_by(available=True).all()
-    return render_template('rooms.html', rooms=rooms)
+    listing_rows = cached_fragment(availability_key('room-listing'), render_room_listing)
+    return render_template('rooms.html', listing_rows=listing_rows)
+
+REVIEWS_PAGE_SIZE = 10
+
+# Pages are keyed by (room_id, Room.version, page). Posting, editing or
+# deleting a review and renaming a reviewer all bump the room's version, so
+# every worker process stops serving the old pages without explicit invalidation.
+review_cache = TTLCache(ttl=app.config['REVIEW_CACHE_TTL'], maxsize=2000)
+
+def load_review_page(room_id, page):
+    """Return one page of a room's reviews, newest first, with reviewer names joined in"""
+    return db.session.query(
+        Review.rating,
+        Review.comment,
+        Review.created_at,
+        User.name.label('user_name')
+    ).join(User, User.id == Review.user_id).filter(
+        Review.room_id == room_id
+    ).order_by(
+        Review.created_at.desc(), Review.id.desc()
+    ).offset((page - 1) * REVIEWS_PAGE_SIZE).limit(REVIEWS_PAGE_SIZE).all()
+
+def can_review_room(user_id, room_id):
+    """True if the user has a completed stay in the room and has not reviewed it yet"""
+    completed_stay = select(Booking.id).where(
+        Booking.user_id == user_id,
+        Booking.room_id == room_id,
+        Booking.status == 'confirmed',
+        Booking.check_out < datetime.now().date()
+    ).exists()
+    already_reviewed = select(Review.id).where(
+        Review.user_id == user_id,
+        Review.room_id == room_id
+    ).exists()
+    return db.session.scalar(select(and_(completed_stay, not_(already_reviewed))))
 
 @app.route('/room/<int:room_id>')
+@conditional_get(room_detail_fingerprint, max_age=60)
+@cached_page(lambda room_id: room_key('room', room_id))
 def room_detail(room_id):
     room = Room.query.get_or_404(room_id)
-    reviews = Review.query.filter_by(room_id=room_id).order_by(Review.created_at.desc()).all()
-    can_review = False
-    if current_user.is_authenticated:
-        completed_bookings = Booking.query.filter_by(
-            user_id=current_user.id,
-            room_id=room_id,
-            status='confirmed'
-        ).filter(Booking.check_out < datetime.now().date()).all()
-        can_review = len(completed_bookings) > 0
-    return render_template('room_detail.html', room=room, reviews=reviews, can_review=can_review)
+    page_count = max((room.rating_count + REVIEWS_PAGE_SIZE - 1) // REVIEWS_PAGE_SIZE, 1)
+    page = min(max(request.args.get('reviews_page', 1, type=int), 1), page_count)
+    reviews = review_cache.get_or_set(
+        (room_id, room.version, page),
+        lambda: load_review_page(room_id, page)
+    )
+    can_review = current_user.is_authenticated and can_review_room(current_user.id, room_id)
+    return render_template('room_detail.html',
+                        room=room,
+                        reviews=reviews,
+                        reviews_page=page,
+                        reviews_page_count=page_count,
+                        can_review=can_review)
+
+@app.route('/room/<int:room_id>/review', methods=['POST'])
+@login_required
+def submit_review(room_id):
+    room = Room.query.get_or_404(room_id)
+    if not can_review_room(current_user.id, room.id):
+        flash('You can review a room once after completing a stay in it.', 'error')
+        return redirect(url_for('room_detail', room_id=room.id))
+
+    rating = request.form.get('rating', type=int)
+    comment = request.form.get('comment', '').strip()
+    if rating not in range(1, 6) or not comment:
+        flash('Please choose a rating and write a comment.', 'error')
+        return redirect(url_for('room_detail', room_id=room.id))
+
+    try:
+        db.session.add(Review(room_id=room.id, user_id=current_user.id, rating=rating, comment=comment))
+        db.session.commit()
+        invalidate_room(room.id)
+        flash('Thank you for your review!', 'success')
+    except IntegrityError:
+        # A concurrent post from the same user got past can_review_room first
+        db.session.rollback()
+        flash('You have already reviewed this room.', 'info')
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error saving review: {str(e)}")
+        flash('Error saving your review. Please try again.', 'error')
+    return redirect(url_for('room_detail', room_id=room.id))
 
 @app.route('/booking/<int:room_id>', methods=['GET', 'POST'])
 @login_required
@@ -121,6 +283,11 @@ def booking(room_id):
                 flash(f'Number of guests must be between 1 and {room.capacity}', 'error')
                 return redirect(url_for('booking', room_id=room_id))
 
+            # Validate room count
+            if room_quantity < 1 or room_quantity > (room.total_rooms or 1):
+                flash(f'Number of rooms must be between 1 and {room.total_rooms or 1}', 'error')
+                return redirect(url_for('booking', room_id=room_id))
+
             # Validate email
             try:
                 validate_email(guest_email)
@@ -128,18 +295,6 @@ def booking(room_id):
                 flash('Please enter a valid email address', 'error')
                 return redirect(url_for('booking', room_id=room_id))
             
-            # Verify room availability for the requested quantity
-            existing_bookings = Booking.query.filter(
-                Booking.room_id == room_id,
-                Booking.status == 'confirmed',
-                Booking.check_in < check_out,
-                Booking.check_out > check_in
-            ).with_entities(func.sum(Booking.room_quantity)).scalar() or 0
-            
-            if existing_bookings + room_quantity > room.total_rooms:
-                flash('Not enough rooms available for the selected dates.', 'error')
-                return redirect(url_for('booking', room_id=room_id))
-            
             # Calculate total amount based on room quantity
             days = (check_out - check_in).days
             amount = room.price * days * room_quantity
@@ -157,9 +312,14 @@ def booking(room_id):
             booking.payment_option = payment_option
             booking.status = 'pending'
             booking.payment_status = 'pending'
+            booking.hold_expires_at = datetime.utcnow() + timedelta(minutes=app.config['BOOKING_HOLD_MINUTES'])
             
-            db.session.add(booking)
-            db.session.commit()
+            # Reserve the rooms and insert the booking atomically
+            try:
+                reserve_booking(booking)
+            except RoomUnavailable:
+                flash('Not enough rooms available for the selected dates.', 'error')
+                return redirect(url_for('booking', room_id=room_id))
             
             # Handle payment based on option
             if payment_option == 'now':
@@ -173,20 +333,23 @@ def booking(room_id):
                     return redirect(url_for('payment', booking_id=booking.id))
                 except Exception as e:
                     app.logger.error(f"Payment error: {str(e)}")
+                    release_booking(booking)
                     db.session.delete(booking)
                     db.session.commit()
                     flash('Error processing payment. Please try again.', 'error')
                     return redirect(url_for('booking', room_id=room_id))
             else:
                 # For pay later option
-                booking.status = 'confirmed'
+                if not set_booking_status(booking, 'confirmed', 'pending'):
+                    flash('Your booking hold has expired. Please book again.', 'error')
+                    return redirect(url_for('booking', room_id=room_id))
                 db.session.commit()
                 
-                # Send confirmation email
+                # Queue confirmation email
                 try:
-                    send_booking_confirmation(booking)
+                    queue_booking_confirmation(booking)
                 except Exception as e:
-                    app.logger.error(f"Error sending confirmation email: {str(e)}")
+                    app.logger.error(f"Error queueing confirmation email: {str(e)}")
                 
                 flash('Booking confirmed! Please complete the payment before check-in.', 'success')
                 return redirect(url_for('my_bookings'))
@@ -205,7 +368,10 @@ def booking(room_id):
 @app.route('/my-bookings')
 @login_required
 def my_bookings():
-    bookings = Booking.query.filter_by(user_id=current_user.id).order_by(Booking.created_at.desc()).all()
+    bookings = Booking.query.filter(
+        Booking.user_id == current_user.id,
+        Booking.status != 'expired'
+    ).order_by(Booking.created_at.desc()).all()
     return render_template('my_bookings.html', bookings=bookings)
 
 @app.route('/bookings/<int:booking_id>/cancel', methods=['POST'])
@@ -226,7 +392,10 @@ def cancel_booking(booking_id):
             flash('Cancellation period has expired', 'error')
             return redirect(url_for('my_bookings'))
         
-        booking.status = 'cancelled'
+        if not set_booking_status(booking, 'cancelled'):
+            # Expired or changed by someone else since it was read
+            flash('This booking was updated in the meantime. Please review it and try again.', 'warning')
+            return redirect(url_for('my_bookings'))
         booking.cancelled_at = datetime.utcnow()
         booking.cancellation_reason = request.form.get('cancellation_reason')
         
@@ -243,12 +412,12 @@ def cancel_booking(booking_id):
         db.session.commit()
         
         try:
-            if send_booking_status_update(booking):
+            if queue_booking_status_update(booking):
                 flash('Booking cancelled successfully. Check your email for details.', 'success')
             else:
                 flash('Booking cancelled but email notification failed.', 'warning')
         except Exception as e:
-            app.logger.error(f"Error sending cancellation email: {str(e)}")
+            app.logger.error(f"Error queueing cancellation email: {str(e)}")
             flash('Booking cancelled but email notification failed.', 'warning')
             
         return redirect(url_for('my_bookings'))
@@ -259,28 +428,56 @@ def cancel_booking(booking_id):
         flash('Error cancelling booking. Please try again.', 'error')
         return redirect(url_for('my_bookings'))
 
+dashboard_cache = TTLCache(ttl=app.config['DASHBOARD_CACHE_TTL'], maxsize=8)
+
+@on_bookings_changed
+def invalidate_dashboard():
+    dashboard_cache.clear()
+
+def compute_dashboard_stats():
+    """Compute all dashboard statistics with a single aggregate query"""
+    today = datetime.now().date()
+    in_house = and_(
+        Booking.status == 'confirmed',
+        Booking.check_in <= today,
+        Booking.check_out > today
+    )
+    row = db.session.execute(select(
+        select(func.count(Room.id)).scalar_subquery().label('total_rooms'),
+        select(func.coalesce(func.sum(Room.total_rooms), 0)).scalar_subquery().label('room_inventory'),
+        select(func.count(Booking.id)).where(Booking.status == 'confirmed').scalar_subquery().label('active_bookings'),
+        select(func.coalesce(func.sum(Room.price * Booking.room_quantity), 0))
+            .select_from(Booking).join(Room, Booking.room_id == Room.id)
+            .where(in_house).scalar_subquery().label('daily_revenue'),
+        select(func.coalesce(func.sum(Booking.room_quantity), 0))
+            .where(in_house).scalar_subquery().label('occupied_rooms')
+    )).one()
+
+    return {
+        'total_rooms': row.total_rooms,
+        'active_bookings': row.active_bookings,
+        'daily_revenue': row.daily_revenue,
+        'occupancy_rate': row.occupied_rooms / max(row.room_inventory, 1) * 100
+    }
+
+def compute_recent_activity():
+    """Last 10 bookings as plain rows, safe to cache across requests"""
+    return db.session.query(
+        Booking.created_at,
+        Booking.guest_name,
+        Booking.status,
+        Room.name.label('room_name')
+    ).join(Room, Booking.room_id == Room.id).order_by(
+        Booking.created_at.desc(), Booking.id.desc()
+    ).limit(10).all()
+
 @app.route('/admin/dashboard')
 @login_required
 @admin_required
 def admin_dashboard():
     try:
-        # Calculate statistics
-        stats = {
-            'total_rooms': Room.query.count(),
-            'active_bookings': Booking.query.filter_by(status='confirmed').count(),
-            'daily_revenue': db.session.query(func.sum(Room.price)).join(Booking).filter(
-                Booking.status == 'confirmed',
-                Booking.check_in <= datetime.now().date(),
-                Booking.check_out > datetime.now().date()
-            ).scalar() or 0,
-            'occupancy_rate': (Booking.query.filter_by(status='confirmed')
-                            .filter(Booking.check_in <= datetime.now().date())
-                            .filter(Booking.check_out > datetime.now().date())
-                            .count() / max(Room.query.count(), 1)) * 100
-        }
-        
-        # Get recent activity (last 10 bookings)
-        recent_activity = Booking.query.order_by(Booking.created_at.desc()).limit(10).all()
+        stats = dashboard_cache.get_or_set('stats', compute_dashboard_stats)
+        recent_activity = dashboard_cache.get_or_set('recent_activity', compute_recent_activity)
         
         return render_template('admin/dashboard.html',
                             stats=stats,
@@ -290,6 +487,14 @@ def admin_dashboard():
         flash('Error loading dashboard', 'error')
         return redirect(url_for('index'))
 
+@app.route('/admin/request-stats')
+@login_required
+@admin_required
+def admin_request_stats():
+    """Per-endpoint query counts and timings for this process, busiest DB users first"""
+    stats = endpoint_stats()
+    return jsonify(dict(sorted(stats.items(), key=lambda item: item[1]['db_ms'], reverse=True)))
+
 @app.route('/admin/rooms')
 @login_required
 @admin_required
@@ -297,6 +502,33 @@ def admin_rooms():
     rooms = Room.query.all()
     return render_template('admin/rooms.html', rooms=rooms)
 
+def update_room_image(room):
+    """Store an uploaded photo, or download a newly entered image URL, for the room.
+
+    Without photo storage (MEDIA_DIR) an entered URL is kept as a plain remote
+    image_url. A submitted empty URL with no upload removes the room's photo.
+    Failures are flashed as warnings and leave the room's current image, so the
+    rest of the form still saves.
+    """
+    upload = request.files.get('image_file')
+    image_url = request.form.get('image_url') or None
+    try:
+        if upload and upload.filename:
+            store_room_image(room, upload.read(app.config['MAX_IMAGE_BYTES'] + 1))
+            # Plain <img> fallback for places that don't use the responsive variants
+            room.image_url = stored_image_url(room)
+        elif 'image_url' in request.form and not image_url:
+            clear_room_image(room)
+        elif image_url and not storage_configured():
+            room.image_url = image_url
+        elif image_url and (image_url != room.image_url or not room.image_variants):
+            ingest_image_url(room, image_url)
+    except InvalidImage as e:
+        app.logger.error(f"Error storing room image: {str(e)}")
+        flash(f'Room image was not updated: {str(e)}', 'warning')
+        if image_url and not room.image_variants:
+            room.image_url = image_url
+
 @app.route('/admin/rooms/add', methods=['POST'])
 @login_required
 @admin_required
@@ -309,12 +541,13 @@ def admin_add_room():
         room.capacity = int(request.form.get('capacity'))
         room.room_type = request.form.get('room_type')
         room.total_rooms = int(request.form.get('total_rooms', 1))
-        room.image_url = request.form.get('image_url')
         room.available = bool(request.form.get('available'))
+        update_room_image(room)
         room.amenities = ['Air Conditioning', 'Free Wi-Fi', 'LED TV', 'Attached Bathroom']
         
         db.session.add(room)
         db.session.commit()
+        invalidate_room(room.id)
         flash('Room added successfully', 'success')
     except Exception as e:
         db.session.rollback()
@@ -335,9 +568,20 @@ def admin_edit_room(room_id):
             room.capacity = int(request.form.get('capacity'))
             room.room_type = request.form.get('room_type')
             room.total_rooms = int(request.form.get('total_rooms', 1))
-            room.image_url = request.form.get('image_url')
             room.available = bool(request.form.get('available'))
+            update_room_image(room)
+            guest_facing_change = any(
+                db.inspect(room).attrs[field].history.has_changes()
+                for field in ('name', 'room_type', 'capacity', 'available')
+            )
             db.session.commit()
+            invalidate_room(room.id)
+
+            if guest_facing_change:
+                try:
+                    queue_room_update_notices(room)
+                except Exception as e:
+                    app.logger.error(f"Error queueing room update notices: {str(e)}")
             flash('Room updated successfully', 'success')
             return redirect(url_for('admin_rooms'))
         except Exception as e:
@@ -354,19 +598,79 @@ def admin_delete_room(room_id):
         room = Room.query.get_or_404(room_id)
         db.session.delete(room)
         db.session.commit()
+        invalidate_room(room_id)
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Error deleting room: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+# Bookings shown per page in the admin booking list
+ADMIN_BOOKINGS_PAGE_SIZE = 50
+
+def parse_booking_cursor(cursor):
+    """Split a "<created_at>_<id>" cursor into its parts, or return None if invalid"""
+    try:
+        created_at, booking_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(booking_id)
+    except (AttributeError, ValueError):
+        return None
+
 @app.route('/admin/bookings')
 @login_required
 @admin_required
 def admin_bookings():
-    # Get all bookings ordered by creation date
-    bookings = Booking.query.order_by(Booking.created_at.desc()).all()
-    return render_template('admin/bookings.html', bookings=bookings)
+    filters = {
+        'status': request.args.get('status', ''),
+        'payment_status': request.args.get('payment_status', ''),
+        'room_id': request.args.get('room_id', ''),
+        'date_from': request.args.get('date_from', ''),
+        'date_to': request.args.get('date_to', '')
+    }
+
+    query = Booking.query.options(joinedload(Booking.room))
+    if filters['status']:
+        query = query.filter(Booking.status == filters['status'])
+    else:
+        # Abandoned holds are only listed when asked for
+        query = query.filter(Booking.status != 'expired')
+    if filters['payment_status']:
+        query = query.filter(Booking.payment_status == filters['payment_status'])
+    if filters['room_id'].isdigit():
+        query = query.filter(Booking.room_id == int(filters['room_id']))
+    try:
+        # Stays overlapping the requested date range
+        if filters['date_from']:
+            query = query.filter(Booking.check_out > datetime.strptime(filters['date_from'], '%Y-%m-%d').date())
+        if filters['date_to']:
+            query = query.filter(Booking.check_in <= datetime.strptime(filters['date_to'], '%Y-%m-%d').date())
+    except ValueError:
+        flash('Please enter valid dates', 'error')
+
+    # Keyset pagination on (created_at, id), newest first
+    cursor = parse_booking_cursor(request.args.get('cursor'))
+    if cursor:
+        created_at, booking_id = cursor
+        query = query.filter(or_(
+            Booking.created_at < created_at,
+            and_(Booking.created_at == created_at, Booking.id < booking_id)
+        ))
+
+    bookings = query.order_by(Booking.created_at.desc(), Booking.id.desc()).limit(ADMIN_BOOKINGS_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(bookings) > ADMIN_BOOKINGS_PAGE_SIZE:
+        bookings = bookings[:ADMIN_BOOKINGS_PAGE_SIZE]
+        last = bookings[-1]
+        next_cursor = f"{last.created_at.isoformat()}_{last.id}"
+
+    rooms = db.session.query(Room.id, Room.name).order_by(Room.name).all()
+    return render_template('admin/bookings.html',
+                        bookings=bookings,
+                        rooms=rooms,
+                        filters=filters,
+                        filter_args={key: value for key, value in filters.items() if value},
+                        next_cursor=next_cursor,
+                        is_first_page=cursor is None)
 
 @app.route('/admin/bookings/<int:booking_id>/update', methods=['POST'])
 @login_required
@@ -380,14 +684,20 @@ def admin_update_booking(booking_id):
         if new_status not in ['confirmed', 'cancelled']:
             return jsonify({'success': False, 'error': 'Invalid status'}), 400
             
-        booking.status = new_status
+        try:
+            changed = set_booking_status(booking, new_status)
+        except RoomUnavailable:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Not enough rooms available to confirm this booking'}), 409
+        if not changed:
+            return jsonify({'success': False, 'error': f'Booking was changed to {booking.status} in the meantime'}), 409
         if new_status == 'cancelled':
             booking.cancelled_at = datetime.utcnow()
             
         db.session.commit()
         
-        # Send email notification
-        if send_booking_status_update(booking):
+        # Queue email notification
+        if queue_booking_status_update(booking):
             return jsonify({'success': True})
         else:
             return jsonify({'success': True, 'warning': 'Email notification failed'})
@@ -1,11 +1,19 @@
 from functools import wraps
 from flask import abort
 from flask_login import current_user
+from sqlalchemy import select
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin:
             abort(403)
+        # current_user may be a cached snapshot, so a demotion made elsewhere
+        # (another worker, create_admin.py, plain SQL) is checked for here
+        from app import db
+        from models import User, user_cache
+        if not db.session.scalar(select(User.is_admin).where(User.id == current_user.id)):
+            user_cache.delete(current_user.id)
+            abort(403)
         return f(*args, **kwargs)
     return decorated_function
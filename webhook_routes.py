@@ -0,0 +1,46 @@
+import json
+import stripe
+from flask import request, jsonify
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import StripeEvent
+from payment import HANDLED_EVENT_TYPES, event_payment_intent_id
+
+if not app.config['STRIPE_WEBHOOK_SECRET']:
+    app.logger.error("STRIPE_WEBHOOK_SECRET environment variable is not set; Stripe webhooks will be rejected")
+
+@app.route('/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+    """Verify and store Stripe events; worker.py applies them to bookings"""
+    if not app.config['STRIPE_WEBHOOK_SECRET']:
+        # Stripe retries 5xx responses, so events arrive once the secret is set
+        return jsonify({'success': False, 'error': 'Webhook signing secret is not configured'}), 503
+
+    payload = request.get_data()
+    signature = request.headers.get('Stripe-Signature')
+
+    try:
+        event = stripe.Webhook.construct_event(payload, signature, app.config['STRIPE_WEBHOOK_SECRET'])
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid payload'}), 400
+    except stripe.error.SignatureVerificationError:
+        return jsonify({'success': False, 'error': 'Invalid signature'}), 400
+
+    if event.type not in HANDLED_EVENT_TYPES:
+        return jsonify({'success': True, 'ignored': True})
+
+    event_data = json.loads(payload)
+    try:
+        db.session.add(StripeEvent(
+            id=event.id,
+            type=event.type,
+            payment_intent_id=event_payment_intent_id(event_data['data']['object']),
+            payload=event_data
+        ))
+        db.session.commit()
+    except IntegrityError:
+        # Stripe retries deliveries; the event id is the primary key so repeats are dropped
+        db.session.rollback()
+        return jsonify({'success': True, 'duplicate': True})
+
+    return jsonify({'success': True})
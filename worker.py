@@ -0,0 +1,50 @@
+import os
+import time
+from prometheus_client import start_http_server
+from app import app, db
+from availability import expire_holds
+from email_utils import deliver_outbox
+from payment import process_stripe_events, cancel_payment_intents
+
+# Seconds to wait before polling again when there was nothing to do
+POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", 5))
+# Port for this process's own metrics endpoint. SMTP timings, Stripe calls made
+# here and the expired/confirmed booking counters are only recorded in this
+# process, and the web process's /metrics cannot see them (it runs in a separate
+# dyno/container), so Prometheus scrapes this port as a second target. It has
+# no METRICS_TOKEN check; keep it on the private network
+METRICS_PORT = os.environ.get("WORKER_METRICS_PORT")
+
+def run_worker():
+    """Apply Stripe events, expire lapsed holds and drain the email outbox until interrupted"""
+    app.logger.info("Background worker started")
+    if METRICS_PORT:
+        start_http_server(int(METRICS_PORT))
+    while True:
+        with app.app_context():
+            try:
+                applied = process_stripe_events()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Error processing Stripe events: {str(e)}")
+                applied = 0
+            try:
+                # Stripe events first, so a payment that just landed confirms its booking
+                expired = expire_holds()
+                if expired:
+                    cancel_payment_intents(expired)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Error expiring booking holds: {str(e)}")
+                expired = []
+            try:
+                sent = deliver_outbox()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Error delivering outbox emails: {str(e)}")
+                sent = 0
+        if not applied and not expired and not sent:
+            time.sleep(POLL_INTERVAL)
+
+if __name__ == "__main__":
+    run_worker()